@@ -0,0 +1,148 @@
+"""AIMD concurrency limit for calls to a shared, unpredictable backend.
+
+Callers take a slot around each request and report how it went. Healthy,
+fast responses raise the limit additively (about +1 per full window of
+successes); throttling (429), server errors (5xx), timeouts or latency above
+the target cut it multiplicatively, at most once per cooldown so one bad burst
+does not collapse the limit to the floor.
+
+Waiters are served by priority (lower first, FIFO within a priority), so a
+freed slot always goes to the most urgent caller.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class AIMDLimiter:
+    def __init__(
+        self,
+        name: str,
+        *,
+        initial: float = 2,
+        minimum: float = 1,
+        maximum: float = 16,
+        latency_target: float = 20.0,
+        decrease_factor: float = 0.5,
+        cooldown: float = 5.0,
+    ) -> None:
+        self.name = name
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self._limit = max(minimum, min(initial, maximum))
+        self._in_flight = 0
+        self._latency_ewma: Optional[float] = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._waiters: List[Tuple[int, int]] = []
+        self._sequence = itertools.count()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, priority: int = 0, timeout: Optional[float] = None) -> None:
+        """Wait for a slot; raise ``TimeoutError`` if none frees up within ``timeout`` seconds."""
+        give_up_at = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while self._waiters[0] != ticket or self._in_flight >= int(self._limit):
+                    if give_up_at is None:
+                        self._cond.wait()
+                        continue
+                    left = give_up_at - time.monotonic()
+                    if left <= 0:
+                        raise TimeoutError(f"No {self.name} slot free within {timeout:.1f}s")
+                    self._cond.wait(left)
+            except BaseException:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiters)
+            self._in_flight += 1
+            # The next waiter in line may also fit under the limit.
+            self._cond.notify_all()
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = 0, timeout: Optional[float] = None) -> Iterator[None]:
+        self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _observe_latency(self, latency: float) -> None:
+        if self._latency_ewma is None:
+            self._latency_ewma = latency
+        else:
+            self._latency_ewma = 0.8 * self._latency_ewma + 0.2 * latency
+
+    def record_success(self, latency: float) -> None:
+        """Report a completed call; must be called while still holding the slot."""
+        with self._cond:
+            self._observe_latency(latency)
+            if latency > self.latency_target:
+                self._decrease(f"slow response ({latency:.1f}s)")
+                return
+            old = int(self._limit)
+            # Only grow when the current limit is actually being used.
+            if self._in_flight >= old - 1:
+                self._limit = min(self.maximum, self._limit + 1.0 / max(self._limit, 1.0))
+            if int(self._limit) != old:
+                self._log_change(old, "healthy responses")
+                self._cond.notify_all()
+            logger.debug(
+                "%s call took %.2fs (limit %d, in flight %d)", self.name, latency, self.limit, self._in_flight
+            )
+
+    def record_failure(self, reason: str, latency: Optional[float] = None) -> None:
+        """Report an overload signal (429, 5xx, timeout); shrinks the limit."""
+        with self._cond:
+            if latency is not None:
+                self._observe_latency(latency)
+            self._decrease(reason)
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        old = int(self._limit)
+        self._limit = max(self.minimum, self._limit * self.decrease_factor)
+        if int(self._limit) != old:
+            self._log_change(old, reason)
+
+    def _log_change(self, old: int, reason: str) -> None:
+        ewma = f"{self._latency_ewma:.1f}s" if self._latency_ewma is not None else "n/a"
+        logger.info(
+            "%s concurrency limit %d -> %d after %s (latency ewma %s, in flight %d)",
+            self.name,
+            old,
+            self.limit,
+            reason,
+            ewma,
+            self._in_flight,
+        )
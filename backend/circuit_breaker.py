@@ -0,0 +1,100 @@
+"""Circuit breaker for a backend that may be down for minutes at a time.
+
+Closed: calls go through; failures and calls slower than ``slow_call_seconds``
+are counted, and ``failure_threshold`` of them in a row open the circuit.
+Open: calls fail immediately with ``CircuitOpenError`` for
+``reset_timeout`` seconds. Half-open: one probe call is let through; its
+success closes the circuit, its failure opens it again.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling while the circuit is open."""
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        slow_call_seconds: Optional[float] = None,
+        reset_timeout: float = 60.0,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def before_call(self) -> None:
+        """Raise ``CircuitOpenError`` unless a call may go through now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    raise CircuitOpenError(f"{self.name} circuit is open")
+                self._state = self.HALF_OPEN
+            if self._probe_in_flight:
+                raise CircuitOpenError(f"{self.name} circuit is half-open, probe in flight")
+            self._probe_in_flight = True
+
+    def record_success(self, latency: float) -> None:
+        if self.slow_call_seconds is not None and latency > self.slow_call_seconds:
+            self.record_failure(f"slow call ({latency:.1f}s)")
+            return
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("%s circuit closed again", self.name)
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_abandoned(self) -> None:
+        """The call ended without telling anything about the backend (e.g. the caller gave up)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self, reason: str) -> None:
+        with self._lock:
+            self._failures += 1
+            probe_failed = self._state == self.HALF_OPEN
+            self._probe_in_flight = False
+            if probe_failed or (self._state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                logger.warning(
+                    "%s circuit opened after %s (%d consecutive failure(s)); failing fast for %.0fs",
+                    self.name,
+                    reason,
+                    self._failures,
+                    self.reset_timeout,
+                )
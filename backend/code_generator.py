@@ -1,26 +1,119 @@
 from __future__ import annotations
 
 import json
+import os
+from dataclasses import dataclass
+from typing import Optional
 
-from . import test4
+from . import env  # noqa: F401
+from . import deadline, devices, otp_pool, test4
+from .rate_limit import AdmissionController, RateLimitExceeded
+
+# PIN requests admitted per minute across all devices, and per device.
+OTP_RATE_PER_MINUTE = float(os.getenv("OTP_RATE_PER_MINUTE", "30"))
+OTP_BURST = int(os.getenv("OTP_BURST", "10"))
+OTP_DEVICE_RATE_PER_MINUTE = float(os.getenv("OTP_DEVICE_RATE_PER_MINUTE", "20"))
+OTP_DEVICE_BURST = int(os.getenv("OTP_DEVICE_BURST", "5"))
+# Over the limit, up to this many callers wait at most this long for a slot.
+OTP_QUEUE_SIZE = int(os.getenv("OTP_QUEUE_SIZE", "8"))
+OTP_QUEUE_MAX_WAIT_SECONDS = float(os.getenv("OTP_QUEUE_MAX_WAIT_SECONDS", "5"))
+# Time a visitor may wait for their PIN, from submit to code on screen.
+SUBMISSION_DEADLINE_SECONDS = float(os.getenv("SUBMISSION_DEADLINE_SECONDS", "20"))
 
 
 class CodeGenerationError(RuntimeError):
     pass
 
 
-def generate_code() -> tuple[str, str]:
-    """Invoke the Igloohome helper and return the code plus raw payload."""
+class CodeRateLimitedError(CodeGenerationError):
+    """Too many PIN requests right now; retry after ``retry_after`` seconds."""
+
+    def __init__(self, message: str, retry_after: int) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class UnknownKioskCodeError(CodeGenerationError):
+    """The requested kiosk is not configured; the caller's mistake, not Igloohome's."""
+
+
+admission = AdmissionController(
+    "OTP",
+    rate=OTP_RATE_PER_MINUTE / 60,
+    burst=OTP_BURST,
+    max_queue=OTP_QUEUE_SIZE,
+    max_wait=OTP_QUEUE_MAX_WAIT_SECONDS,
+)
+for _device in devices.registry.devices:
+    admission.configure(
+        _device.id,
+        rate=(_device.rate_per_minute or OTP_DEVICE_RATE_PER_MINUTE) / 60,
+        burst=_device.burst or OTP_DEVICE_BURST,
+    )
+
+
+@dataclass(frozen=True)
+class IssuedCode:
+    code: str
+    device: devices.Device
+
+
+def _issue_live(device: devices.Device, kiosk: Optional[str]) -> IssuedCode:
+    # A kiosk-bound request must open that kiosk's box; otherwise fail over
+    # to the next healthy device. ``device`` was already admitted by the caller;
+    # each failover target goes through its own token bucket first.
+    attempts = 1 if kiosk else len(devices.registry.devices)
+    for attempt in range(1, attempts + 1):
+        try:
+            return IssuedCode(devices.mint_pin(device), device)
+        except test4.IglooRequestError:
+            if attempt == attempts:
+                raise
+        device = devices.registry.select(kiosk)
+        admission.admit(device.id, max_wait=deadline.remaining())
+    raise AssertionError("unreachable")
+
+
+def issue_code(kiosk: Optional[str] = None) -> IssuedCode:
+    """Return a one-time PIN and the device it opens.
+
+    ``kiosk`` pins the request to that kiosk's device; without it requests are
+    spread over the healthy devices in the registry. PINs come from the
+    pre-minted pool if possible, else from Igloohome. Requests over the
+    admission limit raise ``CodeRateLimitedError`` instead of waiting long, and
+    an unconfigured ``kiosk`` raises ``UnknownKioskCodeError``.
+    Inside a ``deadline`` block, queueing and Igloohome calls only get the
+    time that is left, and running out raises ``CodeGenerationError``.
+    """
     try:
-        payload = test4.generate_one_time_pin()
+        device = devices.registry.select(kiosk)
+        admission.admit(device.id, max_wait=deadline.remaining())
+        pin = otp_pool.pool.take(device.id)
+        issued = IssuedCode(pin, device) if pin is not None else _issue_live(device, kiosk)
+    except devices.UnknownKioskError as exc:
+        raise UnknownKioskCodeError(str(exc)) from exc
+    except RateLimitExceeded as exc:
+        raise CodeRateLimitedError(str(exc), exc.retry_after) from exc
+    except deadline.DeadlineExceeded as exc:
+        raise CodeGenerationError(f"Igloohome did not answer in time: {exc}") from exc
     except (test4.IglooConfigError, test4.IglooRequestError, ValueError) as exc:
         raise CodeGenerationError(str(exc)) from exc
     except Exception as exc:  # pragma: no cover - defensive
         raise CodeGenerationError(f"Unexpected error: {exc}") from exc
 
-    code = payload
-    if not code:
+    if not issued.code:
         raise CodeGenerationError("OTP code missing from response")
 
     #raw_output = json.dumps(payload, indent=2)
-    return code
+    return issued
+
+
+def generate_code(kiosk: Optional[str] = None) -> str:
+    """Return a one-time PIN, from the pre-minted pool if possible, else from Igloohome."""
+    return issue_code(kiosk).code
+
+
+def prefetch_codes() -> None:
+    """Start filling the PIN pools in the background so the first visitors skip the API."""
+    for device in devices.registry.devices:
+        otp_pool.pool.refill(device.id)
@@ -0,0 +1,62 @@
+"""Latency budgets that follow a request through every stage.
+
+``with deadline(20):`` sets an absolute deadline for the calls made inside the
+block. ``http_client``, the LLM limiter, OTP admission and SMTP sends read it
+via ``clamp``/``remaining``, so each stage gets only what is left of the
+budget instead of its own fixed timeout. Nested blocks keep the earlier
+deadline. Work handed to another thread carries the deadline along when
+submitted through ``contextvars.copy_context().run``.
+"""
+from __future__ import annotations
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the current deadline has passed before or during a call."""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block under a deadline ``seconds`` from now (None or <= 0: no new limit)."""
+    if not seconds or seconds <= 0:
+        yield
+        return
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left on the current deadline (may be negative), or None without one."""
+    expires_at = _deadline.get()
+    return None if expires_at is None else expires_at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(stage: str) -> None:
+    if expired():
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+
+def clamp(timeout: float, stage: str = "call") -> float:
+    """``timeout`` capped to the remaining budget; raises if nothing is left."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+    return min(timeout, left)
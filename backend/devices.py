@@ -0,0 +1,157 @@
+"""Registry of Igloohome snack boxes served by this deployment.
+
+Devices come from the JSON file named by ``IGLOO_DEVICES_FILE``::
+
+    [
+      {"id": "SP2X...", "name": "Snackbox Foyer", "location": "EG", "kiosk": "foyer"},
+      {"id": "SP2X...", "name": "Snackbox Lab", "location": "2. OG", "kiosk": "lab",
+       "client_id_env": "IGLOO_CLIENT_ID_LAB", "client_secret_env": "IGLOO_CLIENT_SECRET_LAB",
+       "rate_per_minute": 6, "burst": 3}
+    ]
+
+Without that file the single ``IGLOO_DEVICE_ID`` is used. A request carrying a
+kiosk id goes to that kiosk's device; otherwise requests are spread round-robin
+over devices that are currently healthy. A device that fails
+``DEVICE_FAILURE_THRESHOLD`` times in a row is skipped for
+``DEVICE_COOLDOWN_SECONDS``.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import env  # noqa: F401
+from . import test4
+
+logger = logging.getLogger(__name__)
+
+IGLOO_DEVICES_FILE = os.getenv("IGLOO_DEVICES_FILE")
+DEVICE_FAILURE_THRESHOLD = 3
+DEVICE_COOLDOWN_SECONDS = 60.0
+
+
+class UnknownKioskError(test4.IglooConfigError):
+    """Raised when a kiosk id does not map to any configured device."""
+
+
+@dataclass(frozen=True)
+class Device:
+    id: str
+    name: str
+    location: str = ""
+    kiosk: Optional[str] = None
+    client_id_env: str = "IGLOO_CLIENT_ID"
+    client_secret_env: str = "IGLOO_CLIENT_SECRET"
+    # Per-device OTP admission limits; None uses the OTP_DEVICE_* defaults.
+    rate_per_minute: Optional[float] = None
+    burst: Optional[int] = None
+
+    def credentials(self) -> Tuple[str, str]:
+        return test4._get_env(self.client_id_env), test4._get_env(self.client_secret_env)
+
+
+@dataclass
+class _Health:
+    consecutive_failures: int = 0
+    unhealthy_until: float = 0.0
+
+
+class DeviceRegistry:
+    def __init__(self, devices: List[Device]) -> None:
+        self.devices = devices
+        self._by_id = {device.id: device for device in devices}
+        self._by_kiosk = {device.kiosk: device for device in devices if device.kiosk}
+        self._health: Dict[str, _Health] = {device.id: _Health() for device in devices}
+        self._round_robin = itertools.cycle(devices)
+        self._lock = threading.Lock()
+
+    def get(self, device_id: str) -> Device:
+        return self._by_id[device_id]
+
+    def is_healthy(self, device_id: str) -> bool:
+        return self._health[device_id].unhealthy_until <= time.time()
+
+    def select(self, kiosk: Optional[str] = None) -> Device:
+        """The device for ``kiosk``, or the next healthy device round-robin."""
+        if not self.devices:
+            raise test4.IglooConfigError("No Igloohome devices configured")
+        if kiosk:
+            device = self._by_kiosk.get(kiosk)
+            if device is None:
+                raise UnknownKioskError(f"Unknown kiosk '{kiosk}'")
+            return device
+        with self._lock:
+            for _ in range(len(self.devices)):
+                device = next(self._round_robin)
+                if self.is_healthy(device.id):
+                    return device
+            # Everything is cooling down: use whichever recovers first.
+            return min(self.devices, key=lambda d: self._health[d.id].unhealthy_until)
+
+    def record_success(self, device_id: str) -> None:
+        with self._lock:
+            health = self._health[device_id]
+            health.consecutive_failures = 0
+            health.unhealthy_until = 0.0
+
+    def record_failure(self, device_id: str) -> None:
+        with self._lock:
+            health = self._health[device_id]
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= DEVICE_FAILURE_THRESHOLD:
+                health.unhealthy_until = time.time() + DEVICE_COOLDOWN_SECONDS
+                logger.warning(
+                    "Igloohome device %s failed %d times in a row; skipping it for %.0fs",
+                    device_id,
+                    health.consecutive_failures,
+                    DEVICE_COOLDOWN_SECONDS,
+                )
+
+
+def mint_pin(device: Device, start_date: Optional[str] = None) -> str:
+    """Request a one-time PIN for ``device`` with its credentials, tracking its health."""
+    client_id, client_secret = device.credentials()
+    try:
+        pin = test4.generate_one_time_pin(
+            device_id=device.id,
+            start_date=start_date,
+            client_id=client_id,
+            client_secret=client_secret,
+        )
+    except test4.IglooRequestError:
+        registry.record_failure(device.id)
+        raise
+    registry.record_success(device.id)
+    return pin
+
+
+def _load_devices() -> List[Device]:
+    if IGLOO_DEVICES_FILE:
+        entries = json.loads(Path(IGLOO_DEVICES_FILE).read_text())
+        return [
+            Device(
+                id=entry["id"],
+                name=entry.get("name") or entry["id"],
+                location=entry.get("location", ""),
+                kiosk=entry.get("kiosk"),
+                client_id_env=entry.get("client_id_env", "IGLOO_CLIENT_ID"),
+                client_secret_env=entry.get("client_secret_env", "IGLOO_CLIENT_SECRET"),
+                rate_per_minute=entry.get("rate_per_minute"),
+                burst=entry.get("burst"),
+            )
+            for entry in entries
+        ]
+    device_id = os.getenv("IGLOO_DEVICE_ID")
+    if not device_id:
+        return []
+    return [Device(id=device_id, name="Snackbox")]
+
+
+registry = DeviceRegistry(_load_devices())
@@ -0,0 +1,116 @@
+"""Standalone email dispatcher.
+
+Run with ``python -m backend.dispatcher``. Unfinished queue records are kept in
+a min-heap keyed on the time they next need attention (``send_at`` for pending
+records, lease expiry for in-flight ones). The loop sleeps exactly until the
+earliest entry is due, or until ``storage.queue_email`` sends a wake-up for a
+new record, and then hands off to ``emailer.process_due_emails`` which claims
+and sends whatever is due. A full rescan every ``DISPATCHER_RESCAN_SECONDS``
+catches records written while no wake-up could be delivered.
+
+With the dispatcher running, set ``EMAIL_DISPATCH_IN_UI=false`` so Streamlit
+reruns no longer touch the queue.
+"""
+from __future__ import annotations
+
+import heapq
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from . import env  # noqa: F401
+from . import emailer, storage
+from .wakeup import WakeupListener
+
+logger = logging.getLogger(__name__)
+
+DISPATCHER_RESCAN_SECONDS = float(os.getenv("DISPATCHER_RESCAN_SECONDS", "300"))
+
+
+class Dispatcher:
+    def __init__(self, *, rescan_seconds: float = DISPATCHER_RESCAN_SECONDS) -> None:
+        self.rescan_seconds = rescan_seconds
+        self._heap: List[Tuple[float, str]] = []
+        # Latest wake time per record id; heap entries that disagree are stale.
+        self._scheduled: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._next_rescan = 0.0
+
+    def schedule(self, record_id: str, wake_at: float) -> None:
+        if self._scheduled.get(record_id) == wake_at:
+            return
+        self._scheduled[record_id] = wake_at
+        heapq.heappush(self._heap, (wake_at, record_id))
+
+    def rescan(self) -> None:
+        self._heap = []
+        self._scheduled = {}
+        for wake_at, record_id in storage.pending_wake_times():
+            self.schedule(record_id, wake_at)
+        self._next_rescan = time.time() + self.rescan_seconds
+        logger.info("Dispatcher rescanned queue: %d unfinished record(s)", len(self._scheduled))
+
+    def _pop_due(self, now: float) -> int:
+        popped = 0
+        while self._heap and self._heap[0][0] <= now:
+            wake_at, record_id = heapq.heappop(self._heap)
+            if self._scheduled.get(record_id) == wake_at:
+                del self._scheduled[record_id]
+                popped += 1
+        return popped
+
+    def _seconds_until_next_event(self, now: float) -> float:
+        deadline = self._next_rescan
+        if self._heap:
+            deadline = min(deadline, self._heap[0][0])
+        return max(deadline - now, 0.0)
+
+    def run_once(self, listener: WakeupListener) -> None:
+        now = time.time()
+        if now >= self._next_rescan:
+            self.rescan()
+        if self._pop_due(now):
+            emailer.process_due_emails()
+            # Records another worker still holds come back with their lease expiry.
+            self.rescan()
+            return
+
+        woken = listener.wait(self._seconds_until_next_event(now))
+        if woken is not None:
+            record_id, send_at = woken
+            self.schedule(record_id, send_at)
+
+    def run_forever(self) -> None:
+        listener = WakeupListener()
+        logger.info("Email dispatcher started as %s", storage.WORKER_ID)
+        try:
+            while not self._stop.is_set():
+                try:
+                    self.run_once(listener)
+                except Exception:  # pragma: no cover - keep the daemon alive
+                    logger.exception("Dispatcher iteration failed")
+                    self._stop.wait(5)
+        finally:
+            listener.close()
+            logger.info("Email dispatcher stopped")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    dispatcher = Dispatcher()
+    # Treat SIGTERM like Ctrl+C so a blocking wait is interrupted immediately.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        dispatcher.run_forever()
+    except KeyboardInterrupt:
+        dispatcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Local German email texts for when the LLM is unavailable.
+
+The templates follow the same brief as ``selfie_llm.EMAIL_SYSTEM_PROMPT``
+(DU form, starts with "Hallo!", ends with the reassurance that the picture and
+secrets are safe), but without a personal description. They are compiled once
+at import, and a record always gets the same one, picked by its id.
+"""
+from __future__ import annotations
+
+import hashlib
+from datetime import datetime, timezone
+from string import Template
+from typing import List
+
+_TEXTS = [
+    (
+        "Hallo!\n\n"
+        "schön, dass du $besuch im Creative Space vorbeigeschaut und dir einen Snack gegönnt hast. "
+        "Wir hoffen, er hat dir geschmeckt und dir ein bisschen Energie für den Tag gegeben.\n\n"
+        "Durch das Formular, das du ausgefüllt hast, wissen wir eine ganze Menge über dich – "
+        "aber keine Sorge: Dein Bild und deine Geheimnisse sind bei der Snackmaschine sicher.\n\n"
+        "Bis zum nächsten Snack!\nDeine Snackmaschine"
+    ),
+    (
+        "Hallo!\n\n"
+        "danke für deinen Besuch $besuch. Du hast dir deinen Snack redlich verdient – "
+        "und wir freuen uns, dass du den Creative Space mit deiner guten Laune bereicherst.\n\n"
+        "Ehrlich gesagt wissen wir dank des Formulars, das du ausgefüllt hast, ziemlich viel über dich. "
+        "Aber du kannst beruhigt sein: Dein Bild und deine Geheimnisse bleiben sicher bei der Snackmaschine.\n\n"
+        "Viele Grüße\nDeine Snackmaschine"
+    ),
+    (
+        "Hallo!\n\n"
+        "was für ein schöner Moment $besuch: Du, ein Snack und der Creative Space. "
+        "Wir hoffen, du hattest genauso viel Freude daran wie wir.\n\n"
+        "Das Formular, das du ausgefüllt hast, hat uns so einiges über dich verraten. "
+        "Versprochen: Dein Bild und deine Geheimnisse sind bei der Snackmaschine gut aufgehoben.\n\n"
+        "Lass es dir schmecken!\nDeine Snackmaschine"
+    ),
+]
+
+TEMPLATES: List[Template] = [Template(text) for text in _TEXTS]
+
+
+def _describe_visit(visited_at: float) -> str:
+    moment = datetime.fromtimestamp(visited_at, timezone.utc)
+    return f"am {moment.strftime('%d.%m.%Y')}"
+
+
+def render_fallback_email(record_id: str, visited_at: float) -> str:
+    """A ready-to-send German email for ``record_id``, the same text on every retry."""
+    index = int(hashlib.sha256(record_id.encode()).hexdigest(), 16) % len(TEMPLATES)
+    return TEMPLATES[index].substitute(besuch=_describe_visit(visited_at))
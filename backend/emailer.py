@@ -1,20 +1,25 @@
 from __future__ import annotations
 
 import logging
+import math
 import mimetypes
 import os
 import smtplib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from email.message import EmailMessage
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 
-from dotenv import load_dotenv
-
-from . import selfie_llm, storage
+from . import env  # noqa: F401
+from . import deadline, email_templates, selfie_llm, selfie_variants, storage
+from .queue_record import QueuePriority, QueueRecord
+from .smtp_pool import SMTPPool, SMTPSession
 
 logger = logging.getLogger(__name__)
-load_dotenv()
 
 SMTP_HOST = os.getenv("SMTP_HOST")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
@@ -23,19 +28,77 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
 SMTP_FROM = os.getenv("SMTP_FROM")
 SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "true").lower() in {"1", "true", "yes"}
 EMAIL_SUBJECT = os.getenv("EMAIL_SUBJECT", "Dein Creative Space Snack-Update")
+EMAIL_BACKGROUND_WORKERS = int(os.getenv("EMAIL_BACKGROUND_WORKERS", "4"))
+# Upper bound on dispatch threads; LLM calls within them are further gated by selfie_llm.llm_limiter.
+EMAIL_DISPATCH_CONCURRENCY = int(os.getenv("EMAIL_DISPATCH_CONCURRENCY", "8"))
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", str(EMAIL_DISPATCH_CONCURRENCY)))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "240"))
+# Socket timeout for SMTP connects and sends, capped by the email's deadline.
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "30"))
+# Budget for one email from LLM call to sent message, and the part of it the
+# LLM may use; an LLM that runs out of time gets replaced by a local template.
+EMAIL_DEADLINE_SECONDS = float(os.getenv("EMAIL_DEADLINE_SECONDS", "90"))
+EMAIL_LLM_DEADLINE_SECONDS = float(os.getenv("EMAIL_LLM_DEADLINE_SECONDS", "60"))
+# Records claimed per process_due_emails call; keep well below what fits in one lease.
+EMAIL_DISPATCH_BATCH_SIZE = int(os.getenv("EMAIL_DISPATCH_BATCH_SIZE", "50"))
+# Total attempts per record; failures before the last are re-queued in the retry lane.
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "3"))
+EMAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("EMAIL_RETRY_BACKOFF_SECONDS", "300"))
+
+
+def _parse_lane_weights(value: str) -> Dict[QueuePriority, int]:
+    weights = {QueuePriority.INSTANT: 6, QueuePriority.SCHEDULED: 3, QueuePriority.RETRY: 1}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        try:
+            weights[QueuePriority(name.strip())] = max(1, int(weight))
+        except ValueError:
+            continue
+    return weights
+
+
+# Pending records for the same recipient queued within this many seconds become one email.
+EMAIL_COALESCE_WINDOW_SECONDS = float(os.getenv("EMAIL_COALESCE_WINDOW_SECONDS", "900"))
+
+# Share of each batch (and of dispatch order) given to each lane.
+EMAIL_LANE_WEIGHTS = _parse_lane_weights(os.getenv("EMAIL_LANE_WEIGHTS", "instant=6,scheduled=3,retry=1"))
+# Backlog runs with at least this many non-instant emails formulate their texts
+# in batched LLM requests (selfie_llm.LLM_EMAIL_BATCH_SIZE each); 0 disables.
+EMAIL_BATCH_FORMULATION_MIN = int(os.getenv("EMAIL_BATCH_FORMULATION_MIN", "3"))
+
+# Runs instant sends off the request thread; see schedule_privacy_email(background=True).
+_background_executor = ThreadPoolExecutor(max_workers=EMAIL_BACKGROUND_WORKERS, thread_name_prefix="email-send")
 
 
 class EmailConfigurationError(RuntimeError):
     """Raised when SMTP configuration is incomplete."""
 
 
+@dataclass
+class DispatchSummary:
+    sent: int = 0
+    failed: int = 0
+    duration: float = 0.0
+    # Records delivered as part of another record's email (no LLM run or SMTP send of their own).
+    coalesced: int = 0
+
+    @property
+    def total(self) -> int:
+        return self.sent + self.failed
+
+
 def _require(value: Optional[str], name: str) -> str:
     if not value:
         raise EmailConfigurationError(f"Environment variable '{name}' must be set to send emails")
     return value
 
 
-def _build_email(to_address: str, body: str, attachment: Optional[Path], description: Optional[str]) -> EmailMessage:
+def _build_email(
+    to_address: str,
+    body: str,
+    attachments: Sequence[Path],
+    description: Optional[str],
+) -> EmailMessage:
     msg = EmailMessage()
     msg["Subject"] = EMAIL_SUBJECT
     msg["From"] = _require(SMTP_FROM, "SMTP_FROM")
@@ -47,7 +110,9 @@ def _build_email(to_address: str, body: str, attachment: Optional[Path], descrip
 
     msg.set_content(body + footnote)
 
-    if attachment and attachment.exists():
+    for attachment in attachments:
+        if not attachment.exists():
+            continue
         mime_type, _ = mimetypes.guess_type(attachment.name)
         maintype = "application"
         subtype = "octet-stream"
@@ -63,20 +128,36 @@ def _build_email(to_address: str, body: str, attachment: Optional[Path], descrip
     return msg
 
 
-def _send_email_message(message: EmailMessage) -> None:
+def _open_smtp_connection() -> smtplib.SMTP:
     host = _require(SMTP_HOST, "SMTP_HOST")
     username = _require(SMTP_USERNAME, "SMTP_USERNAME")
     password = _require(SMTP_PASSWORD, "SMTP_PASSWORD")
 
+    timeout = deadline.clamp(SMTP_TIMEOUT_SECONDS, "SMTP connect")
     if SMTP_USE_TLS:
-        with smtplib.SMTP(host, SMTP_PORT) as server:
+        server = smtplib.SMTP(host, SMTP_PORT, timeout=timeout)
+    else:
+        server = smtplib.SMTP_SSL(host, SMTP_PORT, timeout=timeout)
+    try:
+        if SMTP_USE_TLS:
             server.starttls()
-            server.login(username, password)
-            server.send_message(message)
+        server.login(username, password)
+    except BaseException:
+        server.close()
+        raise
+    return server
+
+
+_smtp_pool = SMTPPool(_open_smtp_connection, max_idle=SMTP_POOL_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT)
+
+
+def _send_email_message(message: EmailMessage, smtp: Optional[SMTPSession] = None) -> None:
+    """Send over ``smtp`` if given, otherwise over a pooled session."""
+    timeout = deadline.clamp(SMTP_TIMEOUT_SECONDS, "SMTP send")
+    if smtp is not None:
+        smtp.send(message, timeout=timeout)
     else:
-        with smtplib.SMTP_SSL(host, SMTP_PORT) as server:
-            server.login(username, password)
-            server.send_message(message)
+        _smtp_pool.send(message, timeout=timeout)
 
 
 def schedule_privacy_email(
@@ -85,55 +166,386 @@ def schedule_privacy_email(
     description: Optional[str],
     *,
     send_immediately: bool = True,
+    background: bool = False,
 ) -> str:
+    """Queue the privacy email and, by default, send it right away.
+
+    Submissions for a recipient with records from the last
+    EMAIL_COALESCE_WINDOW_SECONDS are merged at enqueue time (see
+    ``storage.queue_email_coalesced``): a repeated submit of the same selfie
+    sends nothing new, and an instant send takes the recipient's other
+    pending records along in one email. With ``background=True`` the instant send runs on a worker thread and this
+    returns as soon as the record is queued; failures are logged and recorded
+    on the queue entry instead of raised. A background send gets its own
+    EMAIL_DEADLINE_SECONDS budget rather than the caller's deadline.
+    """
     storage.ensure_storage()
-    record = storage.queue_email(email=email, selfie_path=selfie_path, description=description)
+    # Claim the records up front so a concurrent process_due_emails elsewhere skips them.
+    record, claimed = storage.queue_email_coalesced(
+        email=email,
+        selfie_path=selfie_path,
+        description=description,
+        window=EMAIL_COALESCE_WINDOW_SECONDS,
+        lease_owner=storage.new_lease_owner() if send_immediately else None,
+        priority=QueuePriority.INSTANT if send_immediately else QueuePriority.SCHEDULED,
+    )
     logger.info(
         "Queued privacy reminder email",
         extra={
-            "record_id": record["id"],
+            "record_id": record.id,
             "email": email,
-            "selfie_path": record.get("selfie_path"),
-            "send_at": record.get("send_at"),
+            "selfie_path": record.selfie_path,
+            "send_at": record.send_at_iso,
+            "claimed_record_ids": [rec.id for rec in claimed],
         },
     )
 
-    if send_immediately:
-        success = _dispatch_record(record)
+    if send_immediately and not claimed:
+        logger.info(
+            "Same selfie is already being sent to this recipient; not sending it again",
+            extra={"record_id": record.id, "email": email},
+        )
+    elif send_immediately and background:
+        future: Future = _background_executor.submit(_dispatch_group, claimed)
+        future.add_done_callback(_log_background_failure)
+    elif send_immediately:
+        success = _dispatch_group(claimed)
         if not success:
             raise RuntimeError("Instant email dispatch failed; see logs for details")
 
-    return record["send_at"]
+    return record.send_at_iso
+
+
+def _log_background_failure(future: Future) -> None:
+    if future.exception() is not None:  # pragma: no cover - _dispatch_group handles its own errors
+        logger.error("Background email dispatch crashed", exc_info=future.exception())
+
+
+def _claim_batch(current_time: datetime, batch_size: int, owner: str) -> List[QueueRecord]:
+    """Claim up to ``batch_size`` records for ``owner``, split across lanes by weight.
+
+    Each lane first gets its weighted share; capacity a lane does not use is
+    then filled from whatever else is due.
+    """
+    total_weight = sum(EMAIL_LANE_WEIGHTS.values())
+    claimed: List[QueueRecord] = []
+    for lane in QueuePriority:
+        quota = min(math.ceil(batch_size * EMAIL_LANE_WEIGHTS[lane] / total_weight), batch_size - len(claimed))
+        if quota > 0:
+            claimed += storage.claim_due_emails(owner, current_time, limit=quota, priority=lane)
+    if len(claimed) < batch_size:
+        claimed += storage.claim_due_emails(owner, current_time, limit=batch_size - len(claimed))
+    return claimed
+
+
+def _chunk_size(concurrency: int) -> int:
+    """Records to claim at a time: two rounds for the workers the LLM limiter lets run now.
+
+    Small chunks keep every claimed record close to being sent, so leases do
+    not run out while records wait behind a slow LLM.
+    """
+    active = max(1, min(concurrency, selfie_llm.llm_limiter.limit))
+    return max(2 * active, EMAIL_BATCH_FORMULATION_MIN)
+
+
+class _LeaseRenewer:
+    """Extends the leases on claimed records every third of a lease while they are dispatched."""
+
+    def __init__(self, records: List[QueueRecord], owner: str) -> None:
+        self._record_ids = [record.id for record in records]
+        self._owner = owner
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="email-lease", daemon=True)
+
+    def __enter__(self) -> "_LeaseRenewer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(storage.EMAIL_QUEUE_LEASE_SECONDS / 3):
+            try:
+                storage.renew_leases(self._record_ids, self._owner)
+            except Exception:  # pragma: no cover - defensive
+                logger.exception("Could not renew email leases")
 
 
-def process_due_emails(current_time: Optional[datetime] = None) -> None:
+def _weighted_order(records: List[QueueRecord]) -> List[QueueRecord]:
+    """Interleave lanes by EMAIL_LANE_WEIGHTS (smooth weighted round-robin), oldest first per lane."""
+    lanes = {
+        lane: sorted((r for r in records if r.priority is lane), key=lambda r: r.send_at) for lane in QueuePriority
+    }
+    positions = {lane: 0 for lane in QueuePriority}
+    credit = {lane: 0 for lane in QueuePriority}
+    ordered: List[QueueRecord] = []
+    while len(ordered) < len(records):
+        active = [lane for lane in QueuePriority if positions[lane] < len(lanes[lane])]
+        for lane in active:
+            credit[lane] += EMAIL_LANE_WEIGHTS[lane]
+        chosen = max(active, key=lambda lane: (credit[lane], -lane.rank))
+        credit[chosen] -= sum(EMAIL_LANE_WEIGHTS[lane] for lane in active)
+        ordered.append(lanes[chosen][positions[chosen]])
+        positions[chosen] += 1
+    return ordered
+
+
+def _coalesce(records: List[QueueRecord]) -> List[List[QueueRecord]]:
+    """Group records per recipient whose ``queued_at`` lies within the coalescing window.
+
+    Groups keep the position of their first record in ``records``, so the
+    weighted lane order is preserved.
+    """
+    if EMAIL_COALESCE_WINDOW_SECONDS <= 0:
+        return [[record] for record in records]
+
+    by_recipient: Dict[str, List[QueueRecord]] = {}
+    for record in records:
+        by_recipient.setdefault(record.recipient_key, []).append(record)
+
+    group_of: Dict[str, List[QueueRecord]] = {}
+    for recipient_records in by_recipient.values():
+        current: List[QueueRecord] = []
+        for record in sorted(recipient_records, key=lambda r: r.queued_at):
+            if current and record.queued_at - current[0].queued_at > EMAIL_COALESCE_WINDOW_SECONDS:
+                current = []
+            current.append(record)
+            group_of[record.id] = current
+
+    groups: List[List[QueueRecord]] = []
+    seen: set = set()
+    for record in records:
+        group = group_of[record.id]
+        if id(group) not in seen:
+            seen.add(id(group))
+            groups.append(group)
+    return groups
+
+
+def process_due_emails(
+    current_time: Optional[datetime] = None,
+    *,
+    concurrency: Optional[int] = None,
+) -> DispatchSummary:
+    """Claim due records and send them with up to ``concurrency`` workers.
+
+    Records are claimed in small chunks sized to the current LLM concurrency
+    (see ``_chunk_size``), at most EMAIL_DISPATCH_BATCH_SIZE per call, and
+    their leases are renewed while a chunk is in progress. Within a chunk,
+    records are claimed per priority lane (instant, scheduled, retry), together
+    with every other due record of the same recipients, handed out in weighted
+    order and coalesced per recipient, so repeated visits get one LLM run and
+    one email even when they are far apart in the queue. Backlog records have their email texts
+    formulated in batched LLM requests first. Each worker borrows one SMTP
+    session and pulls groups until none are left, so LLM round-trips for
+    different recipients overlap. Storage updates are serialised by the
+    queue lock.
+    """
+    started = time.monotonic()
     current_time = current_time or datetime.now(timezone.utc)
-    due_records = storage.get_due_emails(current_time)
-    if not due_records:
-        return
+    concurrency = concurrency or EMAIL_DISPATCH_CONCURRENCY
+    owner = storage.new_lease_owner()
+    summary = DispatchSummary()
+    messages = 0
+    while summary.total < EMAIL_DISPATCH_BATCH_SIZE:
+        limit = min(_chunk_size(concurrency), EMAIL_DISPATCH_BATCH_SIZE - summary.total)
+        batch = _claim_batch(current_time, limit, owner)
+        if not batch:
+            break
+        records = list(batch)
+        if EMAIL_COALESCE_WINDOW_SECONDS > 0:
+            # Bring these recipients' other due records into the chunk so they can be coalesced.
+            records += storage.claim_due_for_recipients(owner, {rec.recipient_key for rec in batch}, current_time)
+        records = _weighted_order(records)
+        groups = _coalesce(records)
+        with _LeaseRenewer(records, owner):
+            results = _dispatch_chunk(groups, concurrency)
+        summary.sent += sum(results)
+        summary.failed += len(results) - sum(results)
+        summary.coalesced += len(records) - len(groups)
+        messages += len(groups)
+        if len(batch) < limit:
+            break
+    if not summary.total:
+        return summary
+
+    summary.duration = time.monotonic() - started
+    logger.info(
+        "Processed %d due email(s) as %d message(s): %d sent, %d failed in %.1fs",
+        summary.total,
+        messages,
+        summary.sent,
+        summary.failed,
+        summary.duration,
+    )
+    return summary
 
-    for record in due_records:
-        _dispatch_record(record)
 
+def _dispatch_chunk(groups: List[List[QueueRecord]], concurrency: int) -> List[bool]:
+    """Send ``groups`` with up to ``concurrency`` workers; one result per record."""
+    workers = max(1, min(concurrency, len(groups)))
+    # Runs alongside the workers so instant emails do not wait for the backlog pre-pass.
+    prepare_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="email-prepare")
+    prepared = prepare_pool.submit(_formulate_backlog, groups, workers)
+    pending: Iterator[List[QueueRecord]] = iter(groups)
+    pending_lock = threading.Lock()
+    results: List[bool] = []
 
-def _dispatch_record(record: dict) -> bool:
-    record_id = record.get("id")
-    email = record.get("email")
-    selfie_path_str = record.get("selfie_path")
-    selfie_path = Path(selfie_path_str) if selfie_path_str else None
+    def next_group() -> Optional[List[QueueRecord]]:
+        with pending_lock:
+            return next(pending, None)
+
+    def work() -> None:
+        # One authenticated SMTP session per worker for its share of the chunk.
+        with _smtp_pool.session() as smtp:
+            group = next_group()
+            while group is not None:
+                llm_result = None if _is_instant(group) else prepared.result().get(group[0].id)
+                sent = _dispatch_group(group, smtp=smtp, llm_result=llm_result)
+                results.extend([sent] * len(group))
+                group = next_group()
 
     try:
-        description_text = None
-        email_body = "Hallo!"  # fallback minimal message
-        if selfie_path and selfie_path.exists():
-            description_text, email_body = selfie_llm.llm_email_main(str(selfie_path))
-
-        message = _build_email(email, email_body, selfie_path, description_text)
-        _send_email_message(message)
-        storage.mark_email_sent(record_id, email_body=email_body, description=description_text)
-        logger.info("Sent privacy reminder email", extra={"record_id": record_id, "email": email})
-        return True
-    except Exception as exc:  # pragma: no cover - defensive
-        logger.exception("Failed to send privacy email", extra={"record_id": record_id})
-        storage.mark_email_failed(record_id, reason=str(exc))
-        return False
+        if workers == 1:
+            work()
+        else:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="email-dispatch") as pool:
+                for future in [pool.submit(work) for _ in range(workers)]:
+                    future.result()
+    finally:
+        prepare_pool.shutdown(wait=True)
+    return results
+
+
+def _group_selfies(records: List[QueueRecord]) -> Tuple[List[Path], Optional[Path]]:
+    """Distinct selfies of ``records``, newest first, and the newest one that exists."""
+    selfie_paths: List[Path] = []
+    for record in sorted(records, key=lambda r: r.queued_at, reverse=True):
+        if record.selfie_path and Path(record.selfie_path) not in selfie_paths:
+            selfie_paths.append(Path(record.selfie_path))
+    return selfie_paths, next((path for path in selfie_paths if path.exists()), None)
+
+
+def _is_instant(records: List[QueueRecord]) -> bool:
+    return any(record.priority is QueuePriority.INSTANT for record in records)
+
+
+def _formulate_backlog(groups: List[List[QueueRecord]], workers: int) -> Dict[str, Tuple[str, str]]:
+    """Pre-compute (description, email) for backlog groups with batched email formulation.
+
+    Descriptions still need one vision call per selfie (run concurrently), but
+    the email texts are written several per request. Keyed by the id of each
+    group's first record; groups missing from the result (failed description,
+    failed batch) go through the regular per-group path.
+    """
+    if EMAIL_BATCH_FORMULATION_MIN <= 0 or selfie_llm.LLM_PIPELINE_MODE == "fused":
+        return {}
+    selfies: Dict[str, Path] = {}
+    for group in groups:
+        llm_selfie = _group_selfies(group)[1]
+        if not _is_instant(group) and llm_selfie is not None:
+            selfies[group[0].id] = llm_selfie
+    if len(selfies) < EMAIL_BATCH_FORMULATION_MIN:
+        return {}
+
+    def describe(item: Tuple[str, Path]) -> Tuple[str, Optional[str]]:
+        group_id, path = item
+        try:
+            with selfie_llm.request_priority(1):
+                return group_id, selfie_llm.describe_selfie_cached(str(path))
+        except selfie_llm.CircuitOpenError:
+            return group_id, None
+        except Exception:
+            logger.exception("Describing %s for batched formulation failed", path)
+            return group_id, None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="email-describe") as pool:
+        descriptions = {group_id: text for group_id, text in pool.map(describe, selfies.items()) if text}
+    try:
+        with selfie_llm.request_priority(1):
+            emails = selfie_llm.formulate_emails_batch(descriptions)
+    except selfie_llm.CircuitOpenError:
+        return {}
+    except Exception:
+        logger.exception("Batched email formulation failed; falling back to per-email requests")
+        return {}
+    return {group_id: (descriptions[group_id], emails[group_id]) for group_id in emails}
+
+
+def _dispatch_group(
+    records: List[QueueRecord],
+    smtp: Optional[SMTPSession] = None,
+    *,
+    llm_result: Optional[Tuple[str, str]] = None,
+) -> bool:
+    """Send one email covering ``records`` (all for the same recipient).
+
+    The newest available selfie drives the LLM text unless ``llm_result``
+    already carries (description, email body); while the LLM circuit is open,
+    or when the LLM misses EMAIL_LLM_DEADLINE_SECONDS, a local template is sent
+    instead and the records are flagged for enrichment. The whole dispatch runs
+    under EMAIL_DEADLINE_SECONDS. Every distinct selfie is attached. All records
+    are marked sent, or each gets its own failure/retry; either write only
+    applies while the record's lease still belongs to this dispatch.
+    """
+    record_ids = [record.id for record in records]
+    email = records[0].email
+    selfie_paths, llm_selfie = _group_selfies(records)
+
+    # Fresh visitors jump the LLM queue; backlog lanes share what is left.
+    llm_priority = 0 if _is_instant(records) else 1
+    with deadline.deadline(EMAIL_DEADLINE_SECONDS):
+        try:
+            description_text = None
+            email_body = "Hallo!"  # fallback minimal message
+            needs_enrichment = False
+            if llm_result is not None:
+                description_text, email_body = llm_result
+            elif llm_selfie is not None:
+                try:
+                    with selfie_llm.request_priority(llm_priority), deadline.deadline(EMAIL_LLM_DEADLINE_SECONDS):
+                        description_text, email_body = selfie_llm.llm_email_main(str(llm_selfie))
+                except (selfie_llm.CircuitOpenError, deadline.DeadlineExceeded) as exc:
+                    # The LLM is down or too slow: send a local template now instead of holding the email back.
+                    logger.warning(
+                        "Sending template email instead of LLM text: %s", exc, extra={"record_ids": record_ids}
+                    )
+                    newest = max(records, key=lambda r: r.queued_at)
+                    email_body = email_templates.render_fallback_email(newest.id, newest.queued_at)
+                    needs_enrichment = True
+
+            attachments = [selfie_variants.email_image(path) for path in selfie_paths]
+            message = _build_email(email, email_body, attachments, description_text)
+            _send_email_message(message, smtp)
+            for record in records:
+                if not storage.mark_email_sent(
+                    record.id,
+                    email_body=email_body,
+                    description=description_text,
+                    needs_enrichment=needs_enrichment,
+                    owner=record.lease_owner,
+                ):
+                    _log_lost_lease(record)
+            logger.info("Sent privacy reminder email", extra={"record_ids": record_ids, "email": email})
+            return True
+        except Exception as exc:  # pragma: no cover - defensive
+            logger.exception("Failed to send privacy email", extra={"record_ids": record_ids})
+            for record in records:
+                retry_at = None
+                if record.attempts + 1 < EMAIL_MAX_ATTEMPTS:
+                    retry_at = time.time() + EMAIL_RETRY_BACKOFF_SECONDS * (2**record.attempts)
+                if not storage.mark_email_failed(
+                    record.id, reason=str(exc), retry_at=retry_at, owner=record.lease_owner
+                ):
+                    _log_lost_lease(record)
+            return False
+
+
+def _log_lost_lease(record: QueueRecord) -> None:
+    logger.warning(
+        "Lease on record %s was lost during dispatch; leaving its status to the current owner",
+        record.id,
+        extra={"record_id": record.id, "lease_owner": record.lease_owner},
+    )
@@ -0,0 +1,18 @@
+"""Loads ``.env`` into ``os.environ`` once, before any setting is read.
+
+Backend modules read their configuration at import time, so every module
+with settings imports this one first (``from . import env  # noqa: F401``).
+That way the web app, the Streamlit UI and each ``python -m backend.<tool>``
+entry point all see the same values, whatever order modules are imported in.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# backend/.env by path: load_dotenv()'s own search starts at the working
+# directory for interactive sessions and ``python -c``. The usual search
+# still runs afterwards for a .env elsewhere; already-set values win.
+load_dotenv(Path(__file__).resolve().with_name(".env"))
+load_dotenv()
@@ -0,0 +1,135 @@
+"""Hedged requests: send a second copy when the first is slower than usual.
+
+A ``LatencyTracker`` keeps recent latencies of one kind of call. ``hedged``
+runs the call on the caller type's ``HedgePool``; if it has not finished by
+the tracked percentile (p95 by default), an identical backup call starts and
+whichever succeeds first wins. The loser keeps running in the background and
+its result is dropped, so only hedge calls that are safe to duplicate. Until
+``min_samples`` latencies are known, calls are not hedged.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Optional, TypeVar
+
+from . import env  # noqa: F401
+from . import deadline
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+
+class HedgePool:
+    """Threads for the hedged calls of one caller type, so callers cannot starve each other.
+
+    At most ``workers`` attempts (first copies and backups) run at once; when
+    all are busy, calls are not hedged instead of queueing behind others.
+    """
+
+    def __init__(self, name: str, workers: int) -> None:
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"hedge-{name}")
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def try_submit(self, call: Callable[..., T], *args) -> Optional[Future]:
+        """Start ``call(*args)`` if a worker is free, otherwise return None."""
+        if not self._slots.acquire(blocking=False):
+            return None
+        future = self._executor.submit(call, *args)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+
+class LatencyTracker:
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int = 200,
+        percentile: float = HEDGE_PERCENTILE,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+    ) -> None:
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float) -> None:
+        with self._lock:
+            self._samples.append(latency)
+
+    def threshold(self) -> Optional[float]:
+        """The tracked percentile of recent latencies, or None with too few samples."""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+
+def _timed(call: Callable[[], T], tracker: LatencyTracker) -> T:
+    started = time.monotonic()
+    result = call()
+    tracker.record(time.monotonic() - started)
+    return result
+
+
+def hedged(
+    call: Callable[[], T],
+    tracker: LatencyTracker,
+    pool: HedgePool,
+    *,
+    enabled: bool = True,
+    allow: Optional[Callable[[], bool]] = None,
+) -> T:
+    """Run ``call`` on ``pool``, hedging it with a second copy once it passes the tracker's percentile.
+
+    ``allow`` is asked at that moment whether a second request is acceptable
+    (e.g. the backend is not already saturated). The first copy to succeed
+    wins. While ``pool`` has no free worker, ``call`` runs unhedged on the
+    caller's thread instead of queueing.
+    """
+    threshold = tracker.threshold() if enabled else None
+    if threshold is None:
+        return _timed(call, tracker)
+
+    def submit() -> Optional[Future]:
+        return pool.try_submit(contextvars.copy_context().run, _timed, call, tracker)
+
+    primary = submit()
+    if primary is None:
+        return _timed(call, tracker)
+    left = deadline.remaining()
+    done, _ = wait([primary], timeout=threshold if left is None else max(0.0, min(threshold, left)))
+    if done or deadline.expired() or (allow is not None and not allow()):
+        return primary.result()
+
+    backup = submit()
+    if backup is None:
+        logger.info(
+            "%s call slower than p%d; no free %s hedge worker", tracker.name, tracker.percentile * 100, pool.name
+        )
+        return primary.result()
+    logger.info("%s call slower than p%d (%.2fs); sending a hedge", tracker.name, tracker.percentile * 100, threshold)
+    pending = {primary, backup}
+    error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                # The loser keeps running on its worker; its result is dropped.
+                return future.result()
+            error = error or future.exception()
+    assert error is not None
+    raise error
@@ -0,0 +1,120 @@
+"""Shared HTTP sessions for the LLM and Igloohome clients.
+
+One ``requests.Session`` per scheme+host keeps TCP/TLS connections alive
+between calls, so a PIN request right after a token fetch, or a run of LLM
+calls, skips the handshake. Sessions are created lazily and shared by all
+threads; the connection pool per host holds ``HTTP_POOL_SIZE`` connections.
+
+``request`` retries with full-jitter exponential backoff. Failed connects are
+always retried since nothing reached the server. Gateway errors
+(502/503/504), resets and read timeouts are retried only when the caller
+marks the request idempotent (GET-like methods are by default).
+
+Inside a ``deadline`` block every attempt's timeouts are capped to the time
+left, no retry is started that the budget cannot cover, and a timeout caused
+by the deadline surfaces as ``deadline.DeadlineExceeded``.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import env  # noqa: F401
+from . import deadline
+
+logger = logging.getLogger(__name__)
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "16"))
+# Extra attempts after the first, and the base of the jittered backoff between them.
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF_SECONDS = float(os.getenv("HTTP_RETRY_BACKOFF_SECONDS", "0.5"))
+
+_RETRY_STATUSES = frozenset({502, 503, 504})
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def session_for(url: str) -> requests.Session:
+    """The shared keep-alive session for ``url``'s scheme and host."""
+    parts = urlsplit(url)
+    key = f"{parts.scheme}://{parts.netloc}"
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount(key, adapter)
+            _sessions[key] = session
+        return session
+
+
+def _backoff(attempt: int) -> float:
+    return random.uniform(0, HTTP_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+
+def request(
+    method: str,
+    url: str,
+    *,
+    timeout: Union[float, Tuple[float, float]],
+    idempotent: Optional[bool] = None,
+    retries: int = HTTP_RETRIES,
+    **kwargs,
+) -> requests.Response:
+    """Send a request over the shared session, retrying transient failures.
+
+    ``timeout`` is the read timeout (or a ``(connect, read)`` pair). Returns the
+    last response even if its status is an error; raises the last exception if
+    no response was received.
+    """
+    if idempotent is None:
+        idempotent = method.upper() in _IDEMPOTENT_METHODS
+    if not isinstance(timeout, tuple):
+        timeout = (min(HTTP_CONNECT_TIMEOUT, timeout), timeout)
+    session = session_for(url)
+    stage = f"{method} {urlsplit(url).netloc}"
+    for attempt in range(1, retries + 2):
+        last_attempt = attempt > retries
+        connect_timeout, read_timeout = timeout
+        attempt_timeout = (deadline.clamp(connect_timeout, stage), deadline.clamp(read_timeout, stage))
+        try:
+            response = session.request(method, url, timeout=attempt_timeout, **kwargs)
+        except requests.ConnectTimeout as exc:
+            if deadline.expired():
+                raise deadline.DeadlineExceeded(f"Deadline exceeded during {stage}") from exc
+            if last_attempt:
+                raise
+            reason = "connect timeout"
+        except (requests.ConnectionError, requests.Timeout) as exc:
+            if deadline.expired():
+                raise deadline.DeadlineExceeded(f"Deadline exceeded during {stage}") from exc
+            if last_attempt or not idempotent:
+                raise
+            reason = type(exc).__name__
+        else:
+            if last_attempt or not idempotent or response.status_code not in _RETRY_STATUSES:
+                return response
+            reason = f"HTTP {response.status_code}"
+            response.close()
+        delay = _backoff(attempt)
+        left = deadline.remaining()
+        if left is not None and delay >= left:
+            raise deadline.DeadlineExceeded(f"Deadline exceeded before retrying {stage} ({reason})")
+        logger.info("%s %s failed (%s), retrying in %.2fs", method, urlsplit(url).netloc, reason, delay)
+        time.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
@@ -0,0 +1,140 @@
+"""Persistent cache of LLM results.
+
+Keys are built by the caller from everything that determines the output: the
+selfie's content hash (or the description text), the model and a version of
+the prompt. A retry of a record whose description already succeeded, or a
+re-send of the same selfie, then reuses the stored text instead of paying for
+the call again.
+
+Entries live in ``storage/llm_cache.sqlite3``. They expire after
+``LLM_CACHE_TTL_DAYS``, and beyond ``LLM_CACHE_MAX_ENTRIES`` the least recently
+used are dropped (0 disables the cache). The cache is an optimisation only:
+if the database cannot be read or written (locked, corrupt, read-only disk),
+the error is logged and the lookup counts as a miss.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from . import env  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = Path(
+    os.getenv(
+        "LLM_CACHE_FILE",
+        str(Path(__file__).resolve().parent / "storage" / "llm_cache.sqlite3"),
+    )
+)
+LLM_CACHE_TTL_DAYS = float(os.getenv("LLM_CACHE_TTL_DAYS", "30"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used);
+"""
+
+
+def cache_key(*parts: str) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class LLMCache:
+    def __init__(
+        self,
+        path: Path = CACHE_FILE,
+        *,
+        ttl_seconds: float = LLM_CACHE_TTL_DAYS * 86400,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            if not self._initialized:
+                with self._init_lock:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.executescript(_SCHEMA)
+                    self._initialized = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        try:
+            return self._get(key)
+        except (sqlite3.Error, OSError) as exc:
+            logger.warning("LLM cache lookup failed, treating it as a miss: %s", exc)
+            return None
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM llm_cache WHERE key = ? AND created_at > ?",
+                (key, now - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            self._put(key, value)
+        except (sqlite3.Error, OSError) as exc:
+            logger.warning("LLM cache write failed, result not cached: %s", exc)
+
+    def _put(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - self.ttl_seconds,))
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+
+cache = LLMCache()
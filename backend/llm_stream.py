@@ -0,0 +1,96 @@
+"""Reading streamed (SSE) chat completions with an early cutoff.
+
+OpenAI-compatible endpoints stream ``data: {...}`` lines whose
+``choices[0].delta.content`` carry the text, ending with ``data: [DONE]``.
+``read_completion`` stops at the first of: ``[DONE]``, a ``finish_reason``,
+more than ``max_words`` words, or ``is_complete`` accepting the text so far.
+Then it closes the response so the server stops generating for us. A stream
+still running when the current deadline passes raises
+``deadline.DeadlineExceeded``.
+"""
+from __future__ import annotations
+
+import json
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import requests
+
+from . import deadline
+
+_WORD = re.compile(r"\S+")
+_SENTENCE_END = re.compile(r"[.!?…](?=\s|$)")
+
+
+@dataclass
+class StreamResult:
+    text: str
+    # time.monotonic() when the first content arrived, None if none did.
+    first_token_at: Optional[float]
+    finish_reason: Optional[str]
+    cut_off: bool
+
+
+def trim_to_words(text: str, max_words: int) -> str:
+    """Cut ``text`` to ``max_words`` words, preferably at a sentence end."""
+    matches = list(_WORD.finditer(text))
+    if len(matches) <= max_words:
+        return text
+    prefix = text[: matches[max_words - 1].end()]
+    sentence_ends = list(_SENTENCE_END.finditer(prefix))
+    if sentence_ends and sentence_ends[-1].end() > len(prefix) // 2:
+        prefix = prefix[: sentence_ends[-1].end()]
+    return prefix.rstrip()
+
+
+def read_completion(
+    response: requests.Response,
+    *,
+    max_words: Optional[int] = None,
+    is_complete: Optional[Callable[[str], bool]] = None,
+) -> StreamResult:
+    text = ""
+    first_token_at: Optional[float] = None
+    finish_reason: Optional[str] = None
+    cut_off = False
+    try:
+        # On a chunked response, chunk_size=None hands over each chunk as it
+        # arrives instead of waiting for 512 bytes; without chunking it would
+        # read to the end.
+        chunked = "chunked" in response.headers.get("Transfer-Encoding", "").lower()
+        # SSE is UTF-8 by definition, but requests would decode a text/event-stream
+        # without charset as ISO-8859-1, so lines are decoded here instead.
+        for raw_line in response.iter_lines(chunk_size=None if chunked else 512):
+            line = raw_line.decode("utf-8", errors="replace")
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[len("data:") :].strip()
+            if data == "[DONE]":
+                break
+            deadline.check("end of LLM stream")
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            choices = chunk.get("choices") or [{}]
+            delta = (choices[0].get("delta") or {}).get("content") or ""
+            if delta:
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                text += delta
+            finish_reason = choices[0].get("finish_reason")
+            if finish_reason:
+                break
+            if max_words is not None and len(_WORD.findall(text)) > max_words:
+                cut_off = True
+                break
+            if is_complete is not None and delta and is_complete(text):
+                cut_off = True
+                break
+    finally:
+        response.close()
+    if max_words is not None:
+        text = trim_to_words(text, max_words)
+    return StreamResult(text=text, first_token_at=first_token_at, finish_reason=finish_reason, cut_off=cut_off)
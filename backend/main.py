@@ -8,7 +8,7 @@ from typing import Optional
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
-from . import code_generator, emailer, llm_client, storage
+from . import code_generator, deadline, emailer, llm_client, storage
 from .schemas import GenerateCodeResponse, HealthResponse, RegisterRequest, RegisterResponse
 
 logging.basicConfig(level=logging.INFO)
@@ -63,11 +63,25 @@ def register_user(payload: RegisterRequest) -> RegisterResponse:
 
 
 @app.post("/api/generate-code", response_model=GenerateCodeResponse)
-def generate_code_endpoint() -> GenerateCodeResponse:
+def generate_code_endpoint(kiosk: Optional[str] = None) -> GenerateCodeResponse:
     try:
-        code, raw_output = code_generator.generate_code()
+        with deadline.deadline(code_generator.SUBMISSION_DEADLINE_SECONDS):
+            issued = code_generator.issue_code(kiosk)
+    except code_generator.UnknownKioskCodeError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except code_generator.CodeRateLimitedError as exc:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many requests, try again in {exc.retry_after} seconds",
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
     except code_generator.CodeGenerationError as exc:
         logger.exception("Code generation failed")
         raise HTTPException(status_code=502, detail=str(exc)) from exc
 
-    return GenerateCodeResponse(code=code, rawOutput=raw_output)
+    return GenerateCodeResponse(
+        code=issued.code,
+        deviceId=issued.device.id,
+        deviceName=issued.device.name,
+        deviceLocation=issued.device.location or None,
+    )
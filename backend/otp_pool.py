@@ -0,0 +1,104 @@
+"""Pre-minted one-time PINs for instant delivery.
+
+Igloohome one-time PINs requested now all start at the next top of the hour,
+so a PIN minted a few minutes ago is as good as a fresh one. The pool keeps up
+to ``IGLOO_OTP_POOL_SIZE`` PINs per (device, startDate) window and refills in a
+background thread whenever a take leaves fewer than
+``IGLOO_OTP_POOL_LOW_WATER``. When the hour rolls over, PINs for the old window
+are discarded on the next access.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, Optional, Set, Tuple
+
+from . import env  # noqa: F401
+from . import devices, test4
+
+logger = logging.getLogger(__name__)
+
+IGLOO_OTP_POOL_SIZE = int(os.getenv("IGLOO_OTP_POOL_SIZE", "3"))
+IGLOO_OTP_POOL_LOW_WATER = int(os.getenv("IGLOO_OTP_POOL_LOW_WATER", "1"))
+
+
+def _mint(device_id: str, start_date: str) -> str:
+    return devices.mint_pin(devices.registry.get(device_id), start_date)
+
+
+class OTPPool:
+    def __init__(
+        self,
+        mint: Callable[[str, str], str] = _mint,
+        *,
+        size: int = IGLOO_OTP_POOL_SIZE,
+        low_water: int = IGLOO_OTP_POOL_LOW_WATER,
+        current_window: Callable[[], str] = test4.next_start_date,
+    ) -> None:
+        self._mint = mint
+        self.size = size
+        self.low_water = low_water
+        self._current_window = current_window
+        self._pins: Dict[Tuple[str, str], Deque[str]] = {}
+        self._refilling: Set[str] = set()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    def _expire_locked(self, device_id: str, window: str) -> Deque[str]:
+        for key in [key for key in self._pins if key[0] == device_id and key[1] != window]:
+            dropped = self._pins.pop(key)
+            if dropped:
+                logger.info("Discarded %d stale PIN(s) for %s window %s", len(dropped), device_id, key[1])
+        return self._pins.setdefault((device_id, window), deque())
+
+    def available(self, device_id: str) -> int:
+        with self._lock:
+            return len(self._expire_locked(device_id, self._current_window()))
+
+    def take(self, device_id: str) -> Optional[str]:
+        """Pop a PIN for the current window, or None if the pool is empty."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            pins = self._expire_locked(device_id, self._current_window())
+            pin = pins.popleft() if pins else None
+            remaining = len(pins)
+        if remaining < self.low_water:
+            self.refill(device_id)
+        return pin
+
+    def refill(self, device_id: str) -> None:
+        """Top the pool up to ``size`` in a background thread (no-op if one is running)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if device_id in self._refilling:
+                return
+            self._refilling.add(device_id)
+        threading.Thread(target=self._refill, args=(device_id,), name=f"otp-refill-{device_id}", daemon=True).start()
+
+    def _refill(self, device_id: str) -> None:
+        try:
+            while True:
+                window = self._current_window()
+                with self._lock:
+                    if len(self._expire_locked(device_id, window)) >= self.size:
+                        return
+                pin = self._mint(device_id, window)
+                with self._lock:
+                    # If the hour rolled over while minting, the PIN lands in an
+                    # old window and is dropped on the next access.
+                    self._pins.setdefault((device_id, window), deque()).append(pin)
+        except Exception:
+            logger.exception("Refilling the OTP pool for %s failed", device_id)
+        finally:
+            with self._lock:
+                self._refilling.discard(device_id)
+
+
+pool = OTPPool()
@@ -0,0 +1,155 @@
+"""Compaction of the email queue into monthly archive segments.
+
+Sent and failed records older than ``EMAIL_QUEUE_ARCHIVE_AFTER_DAYS`` are
+appended to ``storage/archive/email_queue-YYYY-MM.jsonl`` (one JSON record per
+line, bucketed by completion month) and removed from the hot queue, so due
+checks only pay for pending work. Segments are append-only and can be searched
+with ``python -m backend.queue_archive query``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from . import env  # noqa: F401
+from . import storage
+from .queue_record import QueueRecord, QueueStatus
+
+ARCHIVE_DIR = Path(__file__).resolve().parent / "storage" / "archive"
+ARCHIVE_AFTER_DAYS = float(os.getenv("EMAIL_QUEUE_ARCHIVE_AFTER_DAYS", "7"))
+
+_SEGMENT_PREFIX = "email_queue-"
+
+
+def _segment_path(timestamp: float) -> Path:
+    month = datetime.fromtimestamp(timestamp, timezone.utc).strftime("%Y-%m")
+    return ARCHIVE_DIR / f"{_SEGMENT_PREFIX}{month}.jsonl"
+
+
+def _append_segment(path: Path, records: List[QueueRecord]) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record.to_dict(), ensure_ascii=False))
+            f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def compact_queue(older_than: Optional[timedelta] = None, *, now: Optional[float] = None) -> int:
+    """Move terminal records older than ``older_than`` into archive segments.
+
+    Records are written to the archive before they are removed from the queue,
+    so an interrupted run can at worst leave a record in both places; queries
+    de-duplicate by id. Returns the number of records archived.
+    """
+    if older_than is None:
+        older_than = timedelta(days=ARCHIVE_AFTER_DAYS)
+    now = time.time() if now is None else now
+    candidates = storage.terminal_records_before(now - older_than.total_seconds())
+    if not candidates:
+        return 0
+
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    segments: Dict[Path, List[QueueRecord]] = {}
+    for record in candidates:
+        segments.setdefault(_segment_path(record.finished_at), []).append(record)
+    for path, records in segments.items():
+        _append_segment(path, records)
+
+    return storage.remove_records([record.id for record in candidates])
+
+
+def _segment_month(path: Path) -> Optional[str]:
+    name = path.name
+    if not (name.startswith(_SEGMENT_PREFIX) and name.endswith(".jsonl")):
+        return None
+    return name[len(_SEGMENT_PREFIX) : -len(".jsonl")]
+
+
+def iter_archived_records(
+    *,
+    email: Optional[str] = None,
+    status: Optional[QueueStatus] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+) -> Iterator[QueueRecord]:
+    """Yield archived records matching the filters, oldest segment first.
+
+    ``since``/``until`` compare against the record's completion time and are
+    also used to skip whole segments outside the range.
+    """
+    if not ARCHIVE_DIR.exists():
+        return
+    since_ts = since.timestamp() if since else None
+    until_ts = until.timestamp() if until else None
+    since_month = datetime.fromtimestamp(since_ts, timezone.utc).strftime("%Y-%m") if since_ts else None
+    until_month = datetime.fromtimestamp(until_ts, timezone.utc).strftime("%Y-%m") if until_ts else None
+
+    seen: set = set()
+    for path in sorted(ARCHIVE_DIR.glob(f"{_SEGMENT_PREFIX}*.jsonl")):
+        month = _segment_month(path)
+        if month is None:
+            continue
+        if (since_month and month < since_month) or (until_month and month > until_month):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                record = QueueRecord.from_dict(json.loads(line))
+                if record.id in seen:
+                    continue
+                seen.add(record.id)
+                if email and record.email != email:
+                    continue
+                if status and record.status is not status:
+                    continue
+                if since_ts is not None and record.finished_at < since_ts:
+                    continue
+                if until_ts is not None and record.finished_at > until_ts:
+                    continue
+                yield record
+
+
+def _parse_date(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compact and search the email queue archive.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    compact = subcommands.add_parser("compact", help="Archive sent/failed records older than N days")
+    compact.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS)
+
+    query = subcommands.add_parser("query", help="Print archived records as JSON lines")
+    query.add_argument("--email")
+    query.add_argument("--status", choices=[QueueStatus.SENT.value, QueueStatus.FAILED.value])
+    query.add_argument("--since", type=_parse_date, help="ISO date/time (UTC if no offset)")
+    query.add_argument("--until", type=_parse_date, help="ISO date/time (UTC if no offset)")
+
+    args = parser.parse_args(argv)
+    if args.command == "compact":
+        archived = compact_queue(timedelta(days=args.older_than_days))
+        print(f"Archived {archived} record(s) into {ARCHIVE_DIR}")
+    elif args.command == "query":
+        for record in iter_archived_records(
+            email=args.email,
+            status=QueueStatus(args.status) if args.status else None,
+            since=args.since,
+            until=args.until,
+        ):
+            print(json.dumps(record.to_dict(), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""SQLite engine for the email queue.
+
+Enabled with ``EMAIL_QUEUE_BACKEND=sqlite``. Columns mirror the JSON layout of
+``QueueRecord.to_dict``; ``send_at`` is additionally stored as a UTC epoch so the
+due-lookup can use the ``(status, send_at_ts)`` index instead of scanning.
+
+Run ``python -m backend.queue_db migrate`` once to copy an existing
+``email_queue.json`` into the database.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from . import env  # noqa: F401
+from .queue_record import QueueRecord, epoch_to_iso, iso_to_epoch
+
+DB_FILE = Path(
+    os.getenv(
+        "EMAIL_QUEUE_DB_FILE",
+        str(Path(__file__).resolve().parent / "storage" / "email_queue.sqlite3"),
+    )
+)
+
+COLUMNS = (
+    "id",
+    "email",
+    "selfie_path",
+    "llm_description",
+    "email_body",
+    "queued_at",
+    "send_at",
+    "status",
+    "sent_at",
+    "failed_at",
+    "error",
+    "lease_owner",
+    "lease_expires_at",
+    "priority",
+    "attempts",
+    "needs_enrichment",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS email_queue (
+    id TEXT PRIMARY KEY,
+    email TEXT,
+    selfie_path TEXT,
+    llm_description TEXT,
+    email_body TEXT,
+    queued_at TEXT NOT NULL,
+    send_at TEXT NOT NULL,
+    send_at_ts REAL NOT NULL,
+    status TEXT NOT NULL,
+    sent_at TEXT,
+    failed_at TEXT,
+    error TEXT,
+    lease_owner TEXT,
+    lease_expires_at TEXT,
+    lease_expires_ts REAL,
+    priority TEXT,
+    attempts INTEGER,
+    needs_enrichment INTEGER,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_email_queue_status_send_at ON email_queue (status, send_at_ts);
+"""
+
+# Columns added after the first release; created on older databases at startup.
+_ADDED_COLUMNS = {
+    "lease_owner": "TEXT",
+    "lease_expires_at": "TEXT",
+    "lease_expires_ts": "REAL",
+    "priority": "TEXT",
+    "attempts": "INTEGER",
+    "needs_enrichment": "INTEGER",
+}
+
+_init_lock = threading.Lock()
+_initialized_path: Optional[Path] = None
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    global _initialized_path
+    if _initialized_path == DB_FILE:
+        return
+    with _init_lock:
+        if _initialized_path == DB_FILE:
+            return
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(email_queue)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in existing:
+                conn.execute(f"ALTER TABLE email_queue ADD COLUMN {column} {column_type}")
+        conn.commit()
+        _initialized_path = DB_FILE
+
+
+@contextmanager
+def connect() -> Iterator[sqlite3.Connection]:
+    """Open a short-lived connection; commits on success, rolls back on error."""
+    DB_FILE.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _ensure_schema(conn)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def _record_to_row(record: QueueRecord) -> Dict[str, Any]:
+    data = record.to_dict()
+    row = {column: data.get(column) for column in COLUMNS}
+    row["send_at_ts"] = record.send_at
+    row["lease_expires_ts"] = record.lease_expires_at
+    row["extra"] = json.dumps(record.extra) if record.extra else None
+    return row
+
+
+def _row_to_record(row: sqlite3.Row) -> QueueRecord:
+    data = {column: row[column] for column in COLUMNS}
+    if row["extra"]:
+        data.update(json.loads(row["extra"]))
+    return QueueRecord.from_dict(data)
+
+
+_INSERT_SQL = (
+    "INSERT {verb} INTO email_queue ("
+    + ", ".join(COLUMNS)
+    + ", send_at_ts, lease_expires_ts, extra) VALUES ("
+    + ", ".join(f":{column}" for column in COLUMNS)
+    + ", :send_at_ts, :lease_expires_ts, :extra)"
+)
+
+
+def insert_record(record: QueueRecord) -> None:
+    with connect() as conn:
+        conn.execute(_INSERT_SQL.format(verb="OR REPLACE"), _record_to_row(record))
+
+
+def insert_records(records: Iterable[QueueRecord]) -> int:
+    """Bulk insert, skipping ids that already exist. Returns the number inserted."""
+    with connect() as conn:
+        before = conn.total_changes
+        conn.executemany(_INSERT_SQL.format(verb="OR IGNORE"), (_record_to_row(rec) for rec in records))
+        return conn.total_changes - before
+
+
+def load_records() -> List[QueueRecord]:
+    with connect() as conn:
+        rows = conn.execute("SELECT * FROM email_queue ORDER BY send_at_ts").fetchall()
+    return [_row_to_record(row) for row in rows]
+
+
+def modify_open_records(modify: Callable[[List[QueueRecord]], List[QueueRecord]]) -> None:
+    """Pass the pending and in-flight records to ``modify`` and write back the ones it returns.
+
+    Returned records are inserted or replaced. Everything runs in one write
+    transaction, so concurrent callers see each other's changes.
+    """
+    with connect() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute("SELECT * FROM email_queue WHERE status IN ('pending', 'in_flight')").fetchall()
+        changed = modify([_row_to_record(row) for row in rows])
+        conn.executemany(_INSERT_SQL.format(verb="OR REPLACE"), (_record_to_row(rec) for rec in changed))
+
+
+def fetch_due(current_time: datetime) -> List[QueueRecord]:
+    with connect() as conn:
+        rows = conn.execute(
+            "SELECT * FROM email_queue WHERE status = 'pending' AND send_at_ts <= ? ORDER BY send_at_ts",
+            (current_time.timestamp(),),
+        ).fetchall()
+    return [_row_to_record(row) for row in rows]
+
+
+def claim_due(
+    owner: str,
+    lease_expires_at: float,
+    current_ts: float,
+    limit: Optional[int] = None,
+    priority: Optional[str] = None,
+) -> List[QueueRecord]:
+    """Atomically move claimable records to in_flight under ``owner`` and return them.
+
+    Claimable means pending and due, or in flight with an expired lease;
+    ``priority`` restricts the claim to one lane. The select and update run as
+    one statement, so concurrent workers never claim the same row.
+    """
+    with connect() as conn:
+        rows = conn.execute(
+            """
+            UPDATE email_queue
+            SET status = 'in_flight', lease_owner = :owner,
+                lease_expires_at = :expires_iso, lease_expires_ts = :expires_ts
+            WHERE id IN (
+                SELECT id FROM email_queue
+                WHERE ((status = 'pending' AND send_at_ts <= :now)
+                       OR (status = 'in_flight' AND COALESCE(lease_expires_ts, 0) <= :now))
+                  AND (:priority IS NULL OR COALESCE(priority, 'scheduled') = :priority)
+                ORDER BY send_at_ts
+                LIMIT :limit
+            )
+            RETURNING *
+            """,
+            {
+                "owner": owner,
+                "expires_iso": epoch_to_iso(lease_expires_at),
+                "expires_ts": lease_expires_at,
+                "now": current_ts,
+                "limit": -1 if limit is None else limit,
+                "priority": priority,
+            },
+        ).fetchall()
+    records = [_row_to_record(row) for row in rows]
+    records.sort(key=lambda rec: rec.send_at)
+    return records
+
+
+def renew_leases(record_ids: List[str], owner: str, lease_expires_at: float) -> int:
+    """Move the lease expiry of the in-flight ``record_ids`` still owned by ``owner``."""
+    with connect() as conn:
+        cursor = conn.executemany(
+            """
+            UPDATE email_queue SET lease_expires_at = :expires_iso, lease_expires_ts = :expires_ts
+            WHERE id = :record_id AND status = 'in_flight' AND lease_owner = :owner
+            """,
+            (
+                {
+                    "expires_iso": epoch_to_iso(lease_expires_at),
+                    "expires_ts": lease_expires_at,
+                    "record_id": record_id,
+                    "owner": owner,
+                }
+                for record_id in record_ids
+            ),
+        )
+        return cursor.rowcount
+
+
+# Appended to an UPDATE's WHERE clause: only while :owner (if given) holds the lease.
+_OWNER_FENCE = "AND (:owner IS NULL OR (status = 'in_flight' AND lease_owner = :owner))"
+
+
+def record_failed_attempt(
+    record_id: str,
+    reason: str,
+    failed_at: float,
+    retry_at: Optional[float],
+    *,
+    owner: Optional[str] = None,
+) -> bool:
+    """Count a failed attempt; re-queue in the retry lane at ``retry_at`` or mark failed.
+
+    With ``owner`` the update only applies while that owner holds the lease.
+    Returns False if nothing was updated.
+    """
+    with connect() as conn:
+        if retry_at is None:
+            cursor = conn.execute(
+                """
+                UPDATE email_queue
+                SET status = 'failed', error = :error, failed_at = :failed_at,
+                    attempts = COALESCE(attempts, 0) + 1,
+                    lease_owner = NULL, lease_expires_at = NULL, lease_expires_ts = NULL
+                WHERE id = :record_id {fence}
+                """.format(fence=_OWNER_FENCE),
+                {"error": reason, "failed_at": epoch_to_iso(failed_at), "record_id": record_id, "owner": owner},
+            )
+        else:
+            cursor = conn.execute(
+                """
+                UPDATE email_queue
+                SET status = 'pending', priority = 'retry', error = :error,
+                    send_at = :send_at, send_at_ts = :send_at_ts,
+                    attempts = COALESCE(attempts, 0) + 1,
+                    lease_owner = NULL, lease_expires_at = NULL, lease_expires_ts = NULL
+                WHERE id = :record_id {fence}
+                """.format(fence=_OWNER_FENCE),
+                {
+                    "error": reason,
+                    "send_at": epoch_to_iso(retry_at),
+                    "send_at_ts": retry_at,
+                    "record_id": record_id,
+                    "owner": owner,
+                },
+            )
+        return cursor.rowcount > 0
+
+
+def fetch_wake_times() -> List[Tuple[float, str]]:
+    with connect() as conn:
+        rows = conn.execute(
+            """
+            SELECT CASE WHEN status = 'in_flight' THEN COALESCE(lease_expires_ts, 0) ELSE send_at_ts END, id
+            FROM email_queue WHERE status IN ('pending', 'in_flight')
+            """
+        ).fetchall()
+    return [(row[0], row[1]) for row in rows]
+
+
+def fetch_terminal() -> List[QueueRecord]:
+    with connect() as conn:
+        rows = conn.execute("SELECT * FROM email_queue WHERE status IN ('sent', 'failed')").fetchall()
+    return [_row_to_record(row) for row in rows]
+
+
+def delete_records(record_ids: List[str]) -> int:
+    with connect() as conn:
+        cursor = conn.executemany("DELETE FROM email_queue WHERE id = ?", ((rid,) for rid in record_ids))
+        return cursor.rowcount
+
+
+def update_record(record_id: str, *, owner: Optional[str] = None, **fields: Any) -> bool:
+    """Update columns of a single record by id. Returns False if the id is unknown.
+
+    With ``owner`` the update only applies while that owner holds the
+    record's lease (False otherwise).
+    """
+    unknown = set(fields) - set(COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown email queue columns: {sorted(unknown)}")
+    if not fields:
+        return False
+    assignments = ", ".join(f"{column} = :{column}" for column in fields)
+    if "send_at" in fields:
+        assignments += ", send_at_ts = :send_at_ts"
+        fields["send_at_ts"] = iso_to_epoch(fields["send_at"])
+    if "lease_expires_at" in fields:
+        assignments += ", lease_expires_ts = :lease_expires_ts"
+        fields["lease_expires_ts"] = iso_to_epoch(fields["lease_expires_at"])
+    with connect() as conn:
+        cursor = conn.execute(
+            f"UPDATE email_queue SET {assignments} WHERE id = :record_id {_OWNER_FENCE}",
+            {**fields, "record_id": record_id, "owner": owner},
+        )
+        return cursor.rowcount > 0
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the SQLite email queue.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    migrate = subcommands.add_parser("migrate", help="Copy records from the JSON queue into SQLite")
+    migrate.add_argument("--json", type=Path, default=None, help="Path to email_queue.json")
+    args = parser.parse_args(argv)
+
+    from . import storage
+
+    if args.command == "migrate":
+        source = args.json or storage.EMAIL_QUEUE_FILE
+        inserted = storage.migrate_json_queue_to_sqlite(source)
+        print(f"Migrated {inserted} record(s) from {source} into {DB_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Typed email queue records.
+
+Timestamps are held as UTC epoch seconds so comparisons are plain float checks;
+``to_dict``/``from_dict`` translate to and from the ISO-string layout used by
+``email_queue.json`` so existing files keep loading and stay readable.
+"""
+from __future__ import annotations
+
+import time
+import uuid
+from dataclasses import dataclass, field, replace
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Dict, Optional
+
+
+class QueueStatus(str, Enum):
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class QueuePriority(str, Enum):
+    """Dispatch lane: fresh kiosk visitors first, then due backlog, then retries."""
+
+    INSTANT = "instant"
+    SCHEDULED = "scheduled"
+    RETRY = "retry"
+
+    @property
+    def rank(self) -> int:
+        return _PRIORITY_RANK[self]
+
+
+_PRIORITY_RANK = {QueuePriority.INSTANT: 0, QueuePriority.SCHEDULED: 1, QueuePriority.RETRY: 2}
+
+
+def epoch_to_iso(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+def iso_to_epoch(value: Optional[str], *, default: Optional[float] = None) -> Optional[float]:
+    if not value:
+        return default
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return default
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+# slots=True needs Python 3.10+ (see README); it keeps large queues compact.
+@dataclass(slots=True)
+class QueueRecord:
+    id: str
+    email: Optional[str]
+    selfie_path: Optional[str]
+    llm_description: Optional[str] = None
+    email_body: Optional[str] = None
+    queued_at: float = field(default_factory=time.time)
+    send_at: float = field(default_factory=time.time)
+    status: QueueStatus = QueueStatus.PENDING
+    priority: QueuePriority = QueuePriority.SCHEDULED
+    # Failed dispatch attempts so far.
+    attempts: int = 0
+    sent_at: Optional[float] = None
+    failed_at: Optional[float] = None
+    error: Optional[str] = None
+    # Set while a worker has claimed the record; an expired lease may be re-claimed.
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[float] = None
+    # Sent with a local template while the LLM was unavailable; may be enriched later.
+    needs_enrichment: bool = False
+    # Keys this class does not know about, kept so rewriting a file is lossless.
+    extra: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def send_at_iso(self) -> str:
+        return epoch_to_iso(self.send_at)
+
+    @property
+    def recipient_key(self) -> str:
+        """The address normalised for grouping records of the same recipient."""
+        return (self.email or "").strip().lower()
+
+    @property
+    def is_terminal(self) -> bool:
+        return self.status in (QueueStatus.SENT, QueueStatus.FAILED)
+
+    @property
+    def finished_at(self) -> float:
+        """When the record reached its terminal state (falls back to ``queued_at``)."""
+        if self.status is QueueStatus.SENT and self.sent_at is not None:
+            return self.sent_at
+        if self.status is QueueStatus.FAILED and self.failed_at is not None:
+            return self.failed_at
+        return self.queued_at
+
+    def is_due(self, current_ts: float) -> bool:
+        return self.status is QueueStatus.PENDING and self.send_at <= current_ts
+
+    def is_claimable(self, current_ts: float) -> bool:
+        """Due and pending, or in flight under a lease that has expired."""
+        if self.status is QueueStatus.IN_FLIGHT:
+            return self.lease_expires_at is None or self.lease_expires_at <= current_ts
+        return self.is_due(current_ts)
+
+    def claim(self, owner: str, lease_expires_at: float) -> None:
+        self.status = QueueStatus.IN_FLIGHT
+        self.lease_owner = owner
+        self.lease_expires_at = lease_expires_at
+
+    def release_lease(self) -> None:
+        self.lease_owner = None
+        self.lease_expires_at = None
+
+    def copy(self) -> "QueueRecord":
+        return replace(self, extra=dict(self.extra))
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "QueueRecord":
+        now = time.time()
+        extra = {key: value for key, value in data.items() if key not in _DICT_KEYS}
+        return cls(
+            id=data.get("id") or str(uuid.uuid4()),
+            email=data.get("email"),
+            selfie_path=data.get("selfie_path"),
+            llm_description=data.get("llm_description"),
+            email_body=data.get("email_body"),
+            queued_at=iso_to_epoch(data.get("queued_at"), default=now),
+            send_at=iso_to_epoch(data.get("send_at"), default=now),
+            status=QueueStatus(data.get("status") or QueueStatus.PENDING),
+            priority=QueuePriority(data.get("priority") or QueuePriority.SCHEDULED),
+            attempts=int(data.get("attempts") or 0),
+            sent_at=iso_to_epoch(data.get("sent_at")),
+            failed_at=iso_to_epoch(data.get("failed_at")),
+            error=data.get("error"),
+            lease_owner=data.get("lease_owner"),
+            lease_expires_at=iso_to_epoch(data.get("lease_expires_at")),
+            needs_enrichment=bool(data.get("needs_enrichment")),
+            extra=extra,
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "email": self.email,
+            "selfie_path": self.selfie_path,
+            "llm_description": self.llm_description,
+            "queued_at": epoch_to_iso(self.queued_at),
+            "send_at": epoch_to_iso(self.send_at),
+            "id": self.id,
+            "status": self.status.value,
+            "priority": self.priority.value,
+            "attempts": self.attempts,
+            "sent_at": epoch_to_iso(self.sent_at),
+            "email_body": self.email_body,
+        }
+        if self.failed_at is not None:
+            data["failed_at"] = epoch_to_iso(self.failed_at)
+        if self.error is not None:
+            data["error"] = self.error
+        if self.lease_owner is not None:
+            data["lease_owner"] = self.lease_owner
+            data["lease_expires_at"] = epoch_to_iso(self.lease_expires_at)
+        if self.needs_enrichment:
+            data["needs_enrichment"] = True
+        data.update(self.extra)
+        return data
+
+
+_DICT_KEYS = frozenset(
+    {
+        "id",
+        "email",
+        "selfie_path",
+        "llm_description",
+        "email_body",
+        "queued_at",
+        "send_at",
+        "status",
+        "priority",
+        "attempts",
+        "sent_at",
+        "failed_at",
+        "error",
+        "lease_owner",
+        "lease_expires_at",
+        "needs_enrichment",
+    }
+)
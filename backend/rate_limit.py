@@ -0,0 +1,100 @@
+"""Token-bucket admission control with a short, bounded wait queue.
+
+Each bucket refills at ``rate`` tokens per second up to ``burst``. A caller
+that finds a token proceeds immediately. Otherwise it may reserve the next
+token and sleep until it is due, but only if that wait is at most
+``max_wait`` seconds and fewer than ``max_queue`` callers are already waiting.
+Everyone else is rejected right away with ``RateLimitExceeded`` carrying how
+long to back off, so bursts never pile up blocked workers.
+"""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+
+class RateLimitExceeded(RuntimeError):
+    def __init__(self, name: str, retry_after: float) -> None:
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"{name} rate limit reached, try again in {self.retry_after} seconds")
+
+
+class TokenBucket:
+    """Not thread-safe on its own; ``AdmissionController`` serialises access."""
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        self._refill(now)
+        if self._tokens >= 1:
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (1 - self._tokens) / self.rate
+
+    def take(self) -> None:
+        # May go negative: that is a reservation later callers queue behind.
+        self._tokens -= 1
+
+
+class AdmissionController:
+    """A global bucket plus optional buckets per key (e.g. per device)."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        rate: float,
+        burst: float,
+        max_queue: int = 0,
+        max_wait: float = 0.0,
+    ) -> None:
+        self.name = name
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._global = TokenBucket(rate, burst) if rate > 0 else None
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    def configure(self, key: str, *, rate: float, burst: float) -> None:
+        """Add a bucket for ``key``; keys without one are only globally limited."""
+        with self._lock:
+            self._buckets[key] = TokenBucket(rate, burst)
+
+    def admit(self, key: Optional[str] = None, *, max_wait: Optional[float] = None) -> None:
+        """Return once the call may proceed, or raise ``RateLimitExceeded``.
+
+        ``max_wait`` lowers the configured wait limit for this call, e.g. to
+        what is left of a deadline.
+        """
+        limit = self.max_wait if max_wait is None else min(self.max_wait, max_wait)
+        with self._lock:
+            now = time.monotonic()
+            buckets: Sequence[TokenBucket] = [
+                bucket for bucket in (self._global, self._buckets.get(key) if key else None) if bucket
+            ]
+            wait = max((bucket.wait_time(now) for bucket in buckets), default=0.0)
+            if wait > 0 and (wait > limit or self._waiting >= self.max_queue):
+                raise RateLimitExceeded(self.name, wait)
+            for bucket in buckets:
+                bucket.take()
+            if wait <= 0:
+                return
+            self._waiting += 1
+        try:
+            time.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
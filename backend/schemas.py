@@ -17,7 +17,10 @@ class RegisterResponse(BaseModel):
 
 class GenerateCodeResponse(BaseModel):
     code: str
-    rawOutput: str
+    rawOutput: Optional[str] = None
+    deviceId: Optional[str] = None
+    deviceName: Optional[str] = None
+    deviceLocation: Optional[str] = None
 
 
 class HealthResponse(BaseModel):
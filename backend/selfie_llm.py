@@ -1,25 +1,164 @@
 from __future__ import annotations
 
 import base64
+import contextvars
+import hashlib
+import json
+import logging
+import mimetypes
 import os
-from typing import Tuple
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
 
 import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+from . import env  # noqa: F401
+from . import deadline, hedging, http_client, llm_cache, llm_stream, selfie_store, selfie_variants
+from .adaptive_limit import AIMDLimiter
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
+
+logger = logging.getLogger(__name__)
 
 API_KEY = os.getenv("LLM_API_KEY")
 BASE_URL = os.getenv("LLM_BASE_URL", "https://chat-ai.academiccloud.de/v1")
 MODEL_WITH_IMAGE = os.getenv("LLM_IMAGE_MODEL", "internvl2.5-8b")
 MODEL_EMAIL = os.getenv("LLM_EMAIL_MODEL", "openai-gpt-oss-120b")
+# "two_stage" (describe with the image model, then write with the email model)
+# or "fused" (one multimodal request returning both; falls back to two_stage
+# when its output cannot be parsed).
+LLM_PIPELINE_MODE = os.getenv("LLM_PIPELINE_MODE", "two_stage").strip().lower()
+MODEL_FUSED = os.getenv("LLM_FUSED_MODEL", MODEL_WITH_IMAGE)
+
+# Fail fast once the endpoint looks down: this many failed or slow calls in a
+# row open the circuit for LLM_BREAKER_RESET_SECONDS, after which one probe is tried.
+llm_breaker = CircuitBreaker(
+    "LLM",
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    slow_call_seconds=float(os.getenv("LLM_BREAKER_SLOW_SECONDS", "45")),
+    reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "60")),
+)
+
+# Stream completions (SSE) so reading can stop as soon as a budget is reached.
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() in {"1", "true", "yes"}
+
+# Send a second copy of a completion that is slower than the p95 of its call
+# type, while the limiter has room and the circuit is closed. Costs an extra
+# LLM request per hedge, so it is off by default.
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in {"1", "true", "yes"}
+_latency_trackers: Dict[str, hedging.LatencyTracker] = {}
+# Threads for hedged completions (first copies and backups), separate from the Igloohome pool.
+_hedge_pool = hedging.HedgePool("llm", int(os.getenv("LLM_HEDGE_WORKERS", "8")))
+
+
+def _budget(call_type: str, max_tokens: int, max_words: int) -> Tuple[int, int]:
+    name = call_type.upper()
+    return (
+        int(os.getenv(f"LLM_MAX_TOKENS_{name}", str(max_tokens))),
+        int(os.getenv(f"LLM_MAX_WORDS_{name}", str(max_words))),
+    )
+
+
+# Per call type: max_tokens sent to the API and the word budget enforced while
+# reading (0 disables either). The email prompt asks for under 150 words.
+LLM_BUDGETS: Dict[str, Tuple[int, int]] = {
+    "describe": _budget("describe", 300, 180),
+    "email": _budget("email", 400, 170),
+    "fused": _budget("fused", 700, 0),
+    # max_tokens here is per item; the request gets it times the batch size.
+    "email_batch": _budget("email_batch", 400, 0),
+}
+# Descriptions sent per batched email-formulation request.
+LLM_EMAIL_BATCH_SIZE = int(os.getenv("LLM_EMAIL_BATCH_SIZE", "8"))
+
+
+@dataclass
+class CallStats:
+    call_type: str
+    model: str
+    ttft: Optional[float]
+    total: float
+    words: int
+    cut_off: bool
+
 
+# The most recent calls, for benchmarking budgets and pipeline modes.
+recent_calls: Deque[CallStats] = deque(maxlen=200)
+
+# In-flight LLM requests adapt between these bounds based on latency and 429/5xx responses.
+llm_limiter = AIMDLimiter(
+    "LLM",
+    initial=float(os.getenv("LLM_CONCURRENCY_INITIAL", "2")),
+    minimum=float(os.getenv("LLM_CONCURRENCY_MIN", "1")),
+    maximum=float(os.getenv("LLM_CONCURRENCY_MAX", "16")),
+    latency_target=float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "20")),
+)
+
+DESCRIBE_SYSTEM_PROMPT = (
+    "You always write from a you perspective. You are a sentient snack assistant "
+    "that describes people in images in a friendly, non-sensitive way after they tried "
+    "one of your snacks and adds a friendly compliment."
+)
+DESCRIBE_USER_PROMPT = (
+    "Please describe the person in this image: hair color, approximate age, clothing, "
+    "visible accessories, expression. Add a friendly compliment and say at the end I "
+    "hope you liked the snack from the creative space."
+)
+EMAIL_SYSTEM_PROMPT = (
+    "You are a helpful snack machine that writes short, friendly emails in German to users "
+    "who have just used a snack from the 'Creative Space'. You are provided a description of a "
+    "person. The email should include elements of the description like their clothing for "
+    "example. The email should be polite. Make sure to include a friendly compliment based on "
+    "the description. End the email by saying that you know a lot about them from the form they "
+    "filled out but that their image and secrets are safe with the snack machine. The output "
+    "should only include the email, nothing else. Use 'DU' form, start with 'Hallo!', and keep "
+    "it under 150 words."
+)
+
+FUSED_USER_PROMPT = (
+    "Look at the person in this image and do two things.\n"
+    "1. Describe them in English: hair color, approximate age, clothing, visible accessories, "
+    "expression. Add a friendly compliment and say at the end I hope you liked the snack from "
+    "the creative space.\n"
+    "2. Based on that description, write a short, friendly email in German to them as the snack "
+    "machine of the 'Creative Space'. Mention elements of the description like their clothing, "
+    "include a compliment, and end by saying that you know a lot about them from the form they "
+    "filled out but that their image and secrets are safe with the snack machine. Use 'DU' form, "
+    "start with 'Hallo!', and keep it under 150 words.\n"
+    'Answer with a single JSON object and nothing else: {"description": "...", "email": "..."}'
+)
+
+
+def _prompt_version(*prompts: str) -> str:
+    """Changes whenever a prompt is edited, so cached results from old prompts are not reused."""
+    return hashlib.sha256("\0".join(prompts).encode()).hexdigest()[:12]
+
+
+# Limiter priority for LLM calls made in the current context (lower is served first).
+_request_priority: contextvars.ContextVar[int] = contextvars.ContextVar("llm_request_priority", default=0)
+
+
+@contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    """Queue LLM calls made inside this block at ``priority`` on ``llm_limiter``."""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
 
 
 class LLMConfigurationError(RuntimeError):
     """Raised when required environment variables are missing."""
 
 
+class LLMResponseError(RuntimeError):
+    """Raised when a completion is empty or was cut off by ``max_tokens``."""
+
+
 def _require_api_key() -> str:
     if not API_KEY:
         raise LLMConfigurationError("LLM_API_KEY must be set in the environment to send emails")
@@ -31,42 +170,167 @@ def encode_image_to_data_uri(image_path: str) -> str:
     with open(image_path, "rb") as f:
         img_bytes = f.read()
     b64 = base64.b64encode(img_bytes).decode("utf-8")
-    return f"data:image/jpeg;base64,{b64}"
+    mime_type, _ = mimetypes.guess_type(image_path)
+    return f"data:{mime_type or 'image/jpeg'};base64,{b64}"
+
+
+def _can_hedge() -> bool:
+    return llm_breaker.state == CircuitBreaker.CLOSED and llm_limiter.in_flight < llm_limiter.limit
+
+
+def _post_completion(
+    payload: dict,
+    call_type: str = "default",
+    *,
+    is_complete: Optional[Callable[[str], bool]] = None,
+    items: int = 1,
+) -> dict:
+    """Run a chat completion within the call type's budget.
 
+    Returns the usual ``{"choices": [{"message": {"content": ...}}]}`` shape.
+    When streaming, reading stops at the word budget or once ``is_complete``
+    accepts the text, and the rest of the generation is abandoned. Raises
+    ``CircuitOpenError`` without calling while ``llm_breaker`` is open,
+    ``deadline.DeadlineExceeded`` when the current deadline runs out first, and
+    ``LLMResponseError`` for an empty answer or one truncated by ``max_tokens``
+    (our own word-budget cutoff is fine), so neither is cached or sent.
 
-def _post_completion(payload: dict) -> dict:
+    ``items`` is the number of answers the request produces (a batched email
+    request writes several); the breaker and limiter judge its latency per item.
+    """
+    tracker = _latency_trackers.get(call_type)
+    if tracker is None:
+        tracker = _latency_trackers.setdefault(call_type, hedging.LatencyTracker(f"LLM {call_type}"))
+    return hedging.hedged(
+        lambda: _post_completion_once(payload, call_type, is_complete=is_complete, items=items),
+        tracker,
+        _hedge_pool,
+        enabled=LLM_HEDGE,
+        allow=_can_hedge,
+    )
+
+
+def _post_completion_once(
+    payload: dict,
+    call_type: str,
+    *,
+    is_complete: Optional[Callable[[str], bool]] = None,
+    items: int = 1,
+) -> dict:
+    max_tokens, max_words = LLM_BUDGETS.get(call_type, (0, 0))
+    payload = dict(payload)
+    if max_tokens:
+        payload.setdefault("max_tokens", max_tokens)
+    if LLM_STREAMING:
+        payload["stream"] = True
     headers = {
         "Authorization": f"Bearer {_require_api_key()}",
         "Content-Type": "application/json",
-        "Accept": "application/json",
+        "Accept": "text/event-stream" if LLM_STREAMING else "application/json",
     }
-    response = requests.post(f"{BASE_URL}/chat/completions", json=payload, headers=headers, timeout=60)
+    deadline.check("LLM call")
+    llm_breaker.before_call()
+    # Failure reason reported to the breaker; None once the endpoint answered
+    # normally, "deadline" when we gave up before the endpoint could answer,
+    # "throttled" for a 429 (the endpoint is up, only the limiter backs off).
+    outcome: Optional[str] = "call aborted"
+    latency = signal_latency = 0.0
+    try:
+        try:
+            llm_limiter.acquire(_request_priority.get(), timeout=deadline.remaining())
+        except TimeoutError as exc:
+            outcome = "deadline"
+            raise deadline.DeadlineExceeded("Deadline exceeded waiting for an LLM slot") from exc
+        try:
+            started = time.monotonic()
+            try:
+                # Completions have no side effects, so gateway errors are safe to retry.
+                response = http_client.post(
+                    f"{BASE_URL}/chat/completions",
+                    json=payload,
+                    headers=headers,
+                    timeout=60,
+                    idempotent=True,
+                    stream=LLM_STREAMING,
+                )
+                streamed = None
+                if response.ok and "text/event-stream" in response.headers.get("Content-Type", ""):
+                    streamed = llm_stream.read_completion(
+                        response, max_words=max_words or None, is_complete=is_complete
+                    )
+            except deadline.DeadlineExceeded:
+                outcome = "deadline"
+                raise
+            except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as exc:
+                if deadline.expired():
+                    outcome = "deadline"
+                    raise deadline.DeadlineExceeded("Deadline exceeded reading the LLM response") from exc
+                outcome = "connection error/timeout"
+                llm_limiter.record_failure(outcome, time.monotonic() - started)
+                raise
+            latency = time.monotonic() - started
+            # A batched request may take items times as long as a single one without being slow.
+            signal_latency = latency / max(1, items)
+            if response.status_code == 429:
+                outcome = "throttled"
+                llm_limiter.record_failure("HTTP 429", signal_latency)
+            elif response.status_code >= 500:
+                outcome = f"HTTP {response.status_code}"
+                llm_limiter.record_failure(outcome, signal_latency)
+            else:
+                outcome = None
+                if response.ok:
+                    llm_limiter.record_success(signal_latency)
+        finally:
+            llm_limiter.release()
+    finally:
+        if outcome is None:
+            llm_breaker.record_success(signal_latency)
+        elif outcome in ("deadline", "throttled"):
+            llm_breaker.record_abandoned()
+        else:
+            llm_breaker.record_failure(outcome)
     response.raise_for_status()
-    return response.json()
+
+    if streamed is not None:
+        text, cut_off, finish_reason = streamed.text, streamed.cut_off, streamed.finish_reason
+        ttft = streamed.first_token_at - started if streamed.first_token_at is not None else None
+        result = {"choices": [{"message": {"content": text}, "finish_reason": finish_reason}]}
+    else:
+        # Not streamed (disabled, or the server ignored "stream"): apply the word budget afterwards.
+        result = response.json()
+        text = _extract_message_content(result)
+        finish_reason = result["choices"][0].get("finish_reason")
+        trimmed = llm_stream.trim_to_words(text, max_words) if max_words else text
+        cut_off = trimmed != text
+        result["choices"][0]["message"]["content"] = text = trimmed
+        ttft = None
+    stats = CallStats(call_type, str(payload.get("model")), ttft, latency, len(text.split()), cut_off)
+    recent_calls.append(stats)
+    logger.info(
+        "LLM %s call (%s): ttft %s, total %.2fs, %d words%s",
+        stats.call_type,
+        stats.model,
+        f"{ttft:.2f}s" if ttft is not None else "n/a",
+        latency,
+        stats.words,
+        ", cut off" if cut_off else "",
+    )
+    if not text.strip():
+        raise LLMResponseError(f"LLM {call_type} call returned no text")
+    if finish_reason == "length" and not cut_off:
+        raise LLMResponseError(f"LLM {call_type} answer was truncated at max_tokens ({payload.get('max_tokens')})")
+    return result
 
 
 def describe_person_from_selfie(image_path: str) -> dict:
-    image_data_uri = encode_image_to_data_uri(image_path)
+    image_data_uri = encode_image_to_data_uri(str(selfie_variants.llm_image(Path(image_path))))
     messages = [
-        {
-            "role": "system",
-            "content": (
-                "You always write from a you perspective. You are a sentient snack assistant "
-                "that describes people in images in a friendly, non-sensitive way after they tried "
-                "one of your snacks and adds a friendly compliment."
-            ),
-        },
+        {"role": "system", "content": DESCRIBE_SYSTEM_PROMPT},
         {
             "role": "user",
             "content": [
-                {
-                    "type": "text",
-                    "text": (
-                        "Please describe the person in this image: hair color, approximate age, clothing, "
-                        "visible accessories, expression. Add a friendly compliment and say at the end I "
-                        "hope you liked the snack from the creative space."
-                    ),
-                },
+                {"type": "text", "text": DESCRIBE_USER_PROMPT},
                 {"type": "image_url", "image_url": {"url": image_data_uri}},
             ],
         },
@@ -79,24 +343,12 @@ def describe_person_from_selfie(image_path: str) -> dict:
         "top_p": 0.8,
     }
 
-    return _post_completion(payload)
+    return _post_completion(payload, "describe")
 
 
 def formulate_email(description: str) -> dict:
     messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a helpful snack machine that writes short, friendly emails in German to users "
-                "who have just used a snack from the 'Creative Space'. You are provided a description of a "
-                "person. The email should include elements of the description like their clothing for "
-                "example. The email should be polite. Make sure to include a friendly compliment based on "
-                "the description. End the email by saying that you know a lot about them from the form they "
-                "filled out but that their image and secrets are safe with the snack machine. The output "
-                "should only include the email, nothing else. Use 'DU' form, start with 'Hallo!', and keep "
-                "it under 150 words."
-            ),
-        },
+        {"role": "system", "content": EMAIL_SYSTEM_PROMPT},
         {
             "role": "user",
             "content": [{"type": "text", "text": description}],
@@ -110,7 +362,7 @@ def formulate_email(description: str) -> dict:
         "top_p": 0.8,
     }
 
-    return _post_completion(payload)
+    return _post_completion(payload, "email")
 
 
 def _extract_message_content(response: dict) -> str:
@@ -120,12 +372,211 @@ def _extract_message_content(response: dict) -> str:
         raise RuntimeError(f"Unexpected LLM response format: {response}") from exc
 
 
+def describe_selfie_cached(img_path: str) -> str:
+    """Description text for the selfie, reused for identical images, model and prompt."""
+    key = llm_cache.cache_key(
+        "describe",
+        selfie_store.content_hash(Path(img_path)),
+        MODEL_WITH_IMAGE,
+        _prompt_version(DESCRIBE_SYSTEM_PROMPT, DESCRIBE_USER_PROMPT),
+    )
+    cached = llm_cache.cache.get(key)
+    if cached is not None:
+        logger.info("Reusing cached description for %s", img_path)
+        return cached
+    description_text = _extract_message_content(describe_person_from_selfie(img_path))
+    llm_cache.cache.put(key, description_text)
+    return description_text
+
+
+def _email_cache_key(description: str) -> str:
+    return llm_cache.cache_key("email", description, MODEL_EMAIL, _prompt_version(EMAIL_SYSTEM_PROMPT))
+
+
+def formulate_email_cached(description: str) -> str:
+    """Email body for the description, reused for identical text, model and prompt."""
+    key = _email_cache_key(description)
+    cached = llm_cache.cache.get(key)
+    if cached is not None:
+        logger.info("Reusing cached email body")
+        return cached
+    email_text = _extract_message_content(formulate_email(description))
+    llm_cache.cache.put(key, email_text)
+    return email_text
+
+
+BATCH_EMAIL_INSTRUCTIONS = (
+    "You will receive a JSON list of people, each with an id and a description. Write one email per "
+    "person following the rules above. Answer with a single JSON object mapping each id to its email "
+    "text and nothing else, e.g. {\"1\": \"Hallo! ...\", \"2\": \"Hallo! ...\"}."
+)
+
+
+def formulate_emails(descriptions: List[str]) -> dict:
+    """One request writing an email for each description (ids are list positions from 1)."""
+    items = [{"id": str(index), "description": text} for index, text in enumerate(descriptions, 1)]
+    messages = [
+        {"role": "system", "content": f"{EMAIL_SYSTEM_PROMPT}\n\n{BATCH_EMAIL_INSTRUCTIONS}"},
+        {"role": "user", "content": [{"type": "text", "text": json.dumps(items, ensure_ascii=False)}]},
+    ]
+
+    payload = {
+        "model": MODEL_EMAIL,
+        "messages": messages,
+        "temperature": 0.8,
+        "top_p": 0.8,
+    }
+    per_item_tokens = LLM_BUDGETS["email_batch"][0]
+    if per_item_tokens:
+        payload["max_tokens"] = per_item_tokens * len(descriptions)
+
+    return _post_completion(payload, "email_batch", items=len(descriptions))
+
+
+def _parse_batch_emails(text: str, count: int) -> Dict[int, str]:
+    """Map list positions (1-based) to email texts from a batched reply; missing ids are left out."""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    found: Dict[int, str] = {}
+    while start != -1:
+        try:
+            data, end = decoder.raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        if isinstance(data, dict):
+            for key, value in data.items():
+                index = str(key).strip().lstrip("#")
+                if index.isdigit() and 1 <= int(index) <= count and isinstance(value, str) and value.strip():
+                    found[int(index)] = value.strip()
+            if found:
+                return found
+        start = text.find("{", start + 1)
+    return found
+
+
+def formulate_emails_batch(descriptions: Dict[str, str]) -> Dict[str, str]:
+    """Email bodies for ``{key: description}``, batching uncached ones into few requests.
+
+    Items the model leaves out of a batched reply are formulated one by one.
+    """
+    emails: Dict[str, str] = {}
+    todo: List[Tuple[str, str]] = []
+    for key, description in descriptions.items():
+        cached = llm_cache.cache.get(_email_cache_key(description))
+        if cached is not None:
+            emails[key] = cached
+        else:
+            todo.append((key, description))
+
+    max_words = LLM_BUDGETS["email"][1]
+    batch_size = max(1, LLM_EMAIL_BATCH_SIZE)
+    for offset in range(0, len(todo), batch_size):
+        chunk = todo[offset : offset + batch_size]
+        parsed: Dict[int, str] = {}
+        if len(chunk) > 1:
+            try:
+                reply = _extract_message_content(formulate_emails([description for _, description in chunk]))
+            except LLMResponseError as exc:
+                logger.warning("Batched email formulation failed, formulating one by one: %s", exc)
+            else:
+                parsed = _parse_batch_emails(reply, len(chunk))
+                logger.info("Batched email formulation: %d of %d item(s) answered", len(parsed), len(chunk))
+        for index, (key, description) in enumerate(chunk, 1):
+            if index not in parsed:
+                emails[key] = formulate_email_cached(description)
+                continue
+            email_text = llm_stream.trim_to_words(parsed[index], max_words) if max_words else parsed[index]
+            llm_cache.cache.put(_email_cache_key(description), email_text)
+            emails[key] = email_text
+    return emails
+
+
+def describe_and_formulate(image_path: str) -> dict:
+    """One multimodal request asking for the description and the German email as JSON."""
+    image_data_uri = encode_image_to_data_uri(str(selfie_variants.llm_image(Path(image_path))))
+    messages = [
+        {"role": "system", "content": DESCRIBE_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": FUSED_USER_PROMPT},
+                {"type": "image_url", "image_url": {"url": image_data_uri}},
+            ],
+        },
+    ]
+
+    payload = {
+        "model": MODEL_FUSED,
+        "messages": messages,
+        "temperature": 0.8,
+        "top_p": 0.8,
+    }
+
+    # Stop reading once a complete JSON answer has arrived.
+    return _post_completion(
+        payload,
+        "fused",
+        is_complete=lambda text: text.rstrip().endswith("}") and _parse_fused(text) is not None,
+    )
+
+
+def _parse_fused(text: str) -> Optional[Tuple[str, str]]:
+    """Pull (description, email) out of a fused reply, tolerating fences and chatter."""
+    decoder = json.JSONDecoder()
+    start = text.find("{")
+    while start != -1:
+        try:
+            data, _ = decoder.raw_decode(text, start)
+        except ValueError:
+            start = text.find("{", start + 1)
+            continue
+        if isinstance(data, dict):
+            fields = {str(key).strip().lower(): value for key, value in data.items()}
+            description = fields.get("description")
+            email = fields.get("email") or fields.get("email_body")
+            if isinstance(description, str) and isinstance(email, str) and description.strip() and email.strip():
+                return description.strip(), email.strip()
+        start = text.find("{", start + 1)
+    return None
+
+
+def _fused_email_main(img_path: str) -> Optional[Tuple[str, str]]:
+    key = llm_cache.cache_key(
+        "fused",
+        selfie_store.content_hash(Path(img_path)),
+        MODEL_FUSED,
+        _prompt_version(DESCRIBE_SYSTEM_PROMPT, FUSED_USER_PROMPT),
+    )
+    cached = llm_cache.cache.get(key)
+    if cached is not None:
+        logger.info("Reusing cached fused result for %s", img_path)
+        description_text, email_text = json.loads(cached)
+        return description_text, email_text
+    try:
+        reply = _extract_message_content(describe_and_formulate(img_path))
+    except LLMResponseError as exc:
+        logger.warning("Fused LLM call failed; falling back to two-stage: %s", exc)
+        return None
+    parsed = _parse_fused(reply)
+    if parsed is None:
+        logger.warning("Fused LLM reply could not be parsed; falling back to two-stage: %.200s", reply)
+        return None
+    llm_cache.cache.put(key, json.dumps(parsed, ensure_ascii=False))
+    return parsed
+
+
 def llm_email_main(img_path: str) -> Tuple[str, str]:
     """Return (description_text, email_text) generated from the selfie image."""
-    description_result = describe_person_from_selfie(img_path)
-    description_text = _extract_message_content(description_result)
-
-    email_result = formulate_email(description_text)
-    email_text = _extract_message_content(email_result)
+    started = time.monotonic()
+    mode = LLM_PIPELINE_MODE
+    result = _fused_email_main(img_path) if mode == "fused" else None
+    if result is None:
+        if mode == "fused":
+            mode = "fused->two_stage"
+        description_text = describe_selfie_cached(img_path)
+        email_text = formulate_email_cached(description_text)
+        result = description_text, email_text
 
-    return description_text, email_text
+    logger.info("LLM pipeline %s took %.2fs", mode, time.monotonic() - started)
+    return result
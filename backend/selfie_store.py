@@ -0,0 +1,166 @@
+"""Content-addressed selfie store.
+
+Each selfie is saved as ``selfies/ab/cd/<sha256>.<ext>``: named by the hash
+of its bytes and sharded two levels deep, so no directory grows past a few
+hundred entries and finding a file never needs a listing. Saving bytes that
+are already stored writes nothing; the new queue record simply references the
+existing file. Its variants (see ``selfie_variants``) sit next to it.
+
+Queue records are the references. ``refcounts`` counts them across the hot
+queue and the archive, and ``python -m backend.selfie_store gc`` deletes
+stored selfies that nothing references any more. If the configured queue
+cannot be read, gc refuses to run rather than treat every selfie as unreferenced.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from . import env  # noqa: F401
+from . import llm_cache, selfie_variants
+from .queue_record import QueueRecord
+
+SELFIE_DIR = Path(__file__).resolve().parent / "storage" / "selfies"
+# Unreferenced selfies younger than this are kept; the queue record is written
+# just after the selfie is saved.
+SELFIE_GC_GRACE_SECONDS = 3600
+# One spelling per format, so identical bytes always map to the same file.
+_EXTENSION_ALIASES = {"jpeg": "jpg"}
+
+
+def path_for(digest: str, extension: str) -> Path:
+    return SELFIE_DIR / digest[:2] / digest[2:4] / f"{digest}.{extension}"
+
+
+def put(data: bytes, extension: str) -> Path:
+    """Store ``data`` under its content hash and return the path."""
+    extension = extension.lower()
+    extension = _EXTENSION_ALIASES.get(extension, extension)
+    digest = hashlib.sha256(data).hexdigest()
+    target = path_for(digest, extension)
+    if target.exists():
+        # Refresh the mtime so gc's grace period covers the new reference.
+        os.utime(target)
+        return target
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_name(f"{target.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, target)
+    selfie_variants.ingest(target)
+    return target
+
+
+def _is_stored(path: Path) -> bool:
+    stem = path.name.split(".", 1)[0]
+    return (
+        len(stem) == 64
+        and all(c in "0123456789abcdef" for c in stem)
+        and path.parent.name == stem[2:4]
+        and path.parent.parent.name == stem[:2]
+    )
+
+
+def content_hash(path: Path) -> str:
+    """sha256 of the file, read from the name for stored selfies."""
+    if _is_stored(path):
+        return path.name.split(".", 1)[0]
+    return llm_cache.file_digest(str(path))
+
+
+def _stored_selfies() -> Iterator[Path]:
+    for path in SELFIE_DIR.glob("??/??/*"):
+        if path.name.count(".") == 1 and _is_stored(path):
+            yield path
+
+
+class QueueUnavailableError(RuntimeError):
+    """The email queue could not be read, so which selfies are referenced is unknown."""
+
+
+def _hot_queue_records() -> List[QueueRecord]:
+    # Unlike storage.load_email_queue, never treat a missing or unreadable
+    # queue as empty: gc would then delete every selfie.
+    from . import queue_db, storage
+
+    backend = storage.EMAIL_QUEUE_BACKEND
+    if backend == "sqlite":
+        if not queue_db.DB_FILE.exists():
+            raise QueueUnavailableError(f"SQLite queue {queue_db.DB_FILE} does not exist")
+        try:
+            return queue_db.load_records()
+        except sqlite3.Error as exc:
+            raise QueueUnavailableError(f"Cannot read SQLite queue {queue_db.DB_FILE}: {exc}") from exc
+    if backend != "json":
+        raise QueueUnavailableError(f"Unknown EMAIL_QUEUE_BACKEND {backend!r}")
+    try:
+        data = json.loads(storage.EMAIL_QUEUE_FILE.read_text())
+    except (OSError, ValueError) as exc:
+        raise QueueUnavailableError(f"Cannot read JSON queue {storage.EMAIL_QUEUE_FILE}: {exc}") from exc
+    if not isinstance(data, list):
+        raise QueueUnavailableError(f"JSON queue {storage.EMAIL_QUEUE_FILE} is not a list of records")
+    return [QueueRecord.from_dict(entry) for entry in data]
+
+
+def refcounts() -> Counter:
+    """Number of queue records (hot and archived) referencing each selfie path.
+
+    Raises ``QueueUnavailableError`` if the configured queue or the archive cannot be read.
+    """
+    from . import queue_archive
+
+    counts: Counter = Counter()
+    records = _hot_queue_records()
+    try:
+        records += list(queue_archive.iter_archived_records())
+    except (OSError, ValueError) as exc:
+        raise QueueUnavailableError(f"Cannot read the queue archive: {exc}") from exc
+    for record in records:
+        if record.selfie_path:
+            counts[str(Path(record.selfie_path).resolve())] += 1
+    return counts
+
+
+def collect_garbage(*, now: Optional[float] = None, dry_run: bool = False) -> List[Path]:
+    """Delete stored selfies (and their variants) no queue record references."""
+    now = time.time() if now is None else now
+    counts = refcounts()
+    removed: List[Path] = []
+    for path in _stored_selfies():
+        if counts[str(path.resolve())] or now - path.stat().st_mtime < SELFIE_GC_GRACE_SECONDS:
+            continue
+        removed.append(path)
+        if dry_run:
+            continue
+        for kind in selfie_variants.VARIANTS:
+            selfie_variants.variant_path(path, kind).unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+    return removed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintain the content-addressed selfie store.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    gc = subcommands.add_parser("gc", help="Delete selfies no queue record references")
+    gc.add_argument("--dry-run", action="store_true")
+
+    args = parser.parse_args(argv)
+    if args.command == "gc":
+        try:
+            removed = collect_garbage(dry_run=args.dry_run)
+        except QueueUnavailableError as exc:
+            parser.exit(1, f"Refusing to collect garbage: {exc}\n")
+        verb = "Would delete" if args.dry_run else "Deleted"
+        print(f"{verb} {len(removed)} unreferenced selfie(s)")
+
+
+if __name__ == "__main__":
+    main()
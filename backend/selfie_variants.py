@@ -0,0 +1,84 @@
+"""Downscaled copies of a selfie for the vision model and the email attachment.
+
+Camera captures are far larger than either consumer needs. Right after a
+selfie is saved, ``ingest`` writes two JPEG variants next to it:
+
+- ``<name>.llm.jpg``: longest side ``SELFIE_LLM_MAX_SIDE``, for the prompt
+- ``<name>.email.jpg``: longest side ``SELFIE_EMAIL_MAX_SIDE``, for the attachment
+
+``llm_image`` / ``email_image`` return the variant if it exists and the
+original otherwise, so selfies saved before variants existed, or that could
+not be decoded, keep working. A variant that would not be smaller than the
+original is not written.
+"""
+from __future__ import annotations
+
+import io
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Tuple
+
+from PIL import Image, ImageOps
+
+from . import env  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+SELFIE_LLM_MAX_SIDE = int(os.getenv("SELFIE_LLM_MAX_SIDE", "768"))
+SELFIE_LLM_QUALITY = int(os.getenv("SELFIE_LLM_QUALITY", "80"))
+SELFIE_EMAIL_MAX_SIDE = int(os.getenv("SELFIE_EMAIL_MAX_SIDE", "1280"))
+SELFIE_EMAIL_QUALITY = int(os.getenv("SELFIE_EMAIL_QUALITY", "75"))
+
+# kind -> (max side in pixels, JPEG quality)
+VARIANTS: Dict[str, Tuple[int, int]] = {
+    "llm": (SELFIE_LLM_MAX_SIDE, SELFIE_LLM_QUALITY),
+    "email": (SELFIE_EMAIL_MAX_SIDE, SELFIE_EMAIL_QUALITY),
+}
+
+
+def variant_path(original: Path, kind: str) -> Path:
+    return original.with_name(f"{original.stem}.{kind}.jpg")
+
+
+def _encode(image: Image.Image, max_side: int, quality: int) -> bytes:
+    copy = image.copy()
+    copy.thumbnail((max_side, max_side))
+    buffer = io.BytesIO()
+    copy.save(buffer, format="JPEG", quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def ingest(original: Path) -> None:
+    """Write the LLM and email variants for ``original``."""
+    try:
+        with Image.open(original) as opened:
+            # Camera JPEGs are often stored sideways with an EXIF rotation flag.
+            image = ImageOps.exif_transpose(opened).convert("RGB")
+    except (OSError, Image.DecompressionBombError):
+        # DecompressionBombError: the header claims far more pixels than a selfie has.
+        logger.warning("Could not decode selfie %s; using the original as-is", original)
+        return
+    original_size = original.stat().st_size
+    for kind, (max_side, quality) in VARIANTS.items():
+        data = _encode(image, max_side, quality)
+        if len(data) >= original_size:
+            continue
+        target = variant_path(original, kind)
+        tmp_path = target.with_name(target.name + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, target)
+        logger.debug("Wrote %s variant of %s (%d -> %d bytes)", kind, original.name, original_size, len(data))
+
+
+def _variant_or_original(original: Path, kind: str) -> Path:
+    variant = variant_path(original, kind)
+    return variant if variant.exists() else original
+
+
+def llm_image(original: Path) -> Path:
+    return _variant_or_original(original, "llm")
+
+
+def email_image(original: Path) -> Path:
+    return _variant_or_original(original, "email")
@@ -0,0 +1,142 @@
+"""Reusable authenticated SMTP sessions.
+
+Opening an SMTP connection costs a TCP connect, STARTTLS and AUTH. The pool
+keeps a few logged-in sessions around so consecutive emails (a backlog run,
+several kiosk visitors in a row) skip that handshake. A reused session is
+probed with NOOP before each send and reopened if the server dropped it.
+Once the message has been handed over, errors are raised rather than
+retried: the server may already have accepted it, and a resend would
+deliver it twice.
+"""
+from __future__ import annotations
+
+import logging
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.message import EmailMessage
+from typing import Callable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Errors after which the connection's state is unknown, so it is not reused.
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+class SMTPSession:
+    """One lazily opened connection; used by a single thread at a time."""
+
+    def __init__(self, connect: Callable[[], smtplib.SMTP]) -> None:
+        self._connect = connect
+        self._server: Optional[smtplib.SMTP] = None
+        self.last_used = time.monotonic()
+
+    @property
+    def connected(self) -> bool:
+        return self._server is not None
+
+    def is_alive(self) -> bool:
+        if self._server is None:
+            return False
+        try:
+            return self._server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message: EmailMessage, timeout: Optional[float] = None) -> None:
+        """Send ``message``; ``timeout`` bounds each socket operation of this send.
+
+        Only a connection found dead before the message is handed over is
+        replaced; a failure during the send itself is raised to the caller.
+        """
+        self._prepare(timeout)
+        try:
+            self._server.send_message(message)
+        except _CONNECTION_ERRORS:
+            self.close()
+            raise
+        self.last_used = time.monotonic()
+
+    def _prepare(self, timeout: Optional[float]) -> None:
+        if self._server is not None:
+            self._apply_timeout(timeout)
+            if self.is_alive():
+                return
+            logger.info("SMTP connection dropped, reconnecting")
+            self.close()
+        self._server = self._connect()
+        self._apply_timeout(timeout)
+
+    def _apply_timeout(self, timeout: Optional[float]) -> None:
+        sock = getattr(self._server, "sock", None)
+        if sock is not None:
+            # Without a per-send timeout, fall back to the one the connection was opened with.
+            sock.settimeout(timeout if timeout is not None else self._server.timeout)
+
+    def close(self) -> None:
+        server, self._server = self._server, None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+
+class SMTPPool:
+    def __init__(
+        self,
+        connect: Callable[[], smtplib.SMTP],
+        *,
+        max_idle: int = 2,
+        idle_timeout: float = 240.0,
+    ) -> None:
+        self._connect = connect
+        self.max_idle = max_idle
+        # Idle sessions older than this are assumed dropped by the server.
+        self.idle_timeout = idle_timeout
+        self._idle: List[SMTPSession] = []
+        self._lock = threading.Lock()
+
+    def _checkout(self) -> SMTPSession:
+        while True:
+            with self._lock:
+                session = self._idle.pop() if self._idle else None
+            if session is None:
+                return SMTPSession(self._connect)
+            if time.monotonic() - session.last_used > self.idle_timeout:
+                session.close()
+                continue
+            return session
+
+    def _checkin(self, session: SMTPSession) -> None:
+        if not session.connected:
+            return
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(session)
+                return
+        session.close()
+
+    @contextmanager
+    def session(self) -> Iterator[SMTPSession]:
+        """Borrow a session for a batch of sends; it returns to the pool afterwards."""
+        session = self._checkout()
+        try:
+            yield session
+        except BaseException:
+            session.close()
+            raise
+        finally:
+            self._checkin(session)
+
+    def send(self, message: EmailMessage, timeout: Optional[float] = None) -> None:
+        with self.session() as session:
+            session.send(message, timeout=timeout)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            session.close()
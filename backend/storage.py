@@ -3,20 +3,46 @@ from __future__ import annotations
 import base64
 import json
 import os
+import socket
+import threading
+import time
 import uuid
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import IO, Dict, Iterable, List, Optional, Tuple
 
-SELFIE_DIR = Path(__file__).resolve().parent / "storage" / "selfies"
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock
+    fcntl = None
+
+from . import env  # noqa: F401
+from . import queue_db, selfie_store, wakeup
+from .queue_record import QueuePriority, QueueRecord, QueueStatus, epoch_to_iso
+
+SELFIE_DIR = selfie_store.SELFIE_DIR
 SELFIE_DIR.mkdir(parents=True, exist_ok=True)
 
 EMAIL_QUEUE_FILE = Path(__file__).resolve().parent / "storage" / "email_queue.json"
+# "json" (default) keeps the queue in EMAIL_QUEUE_FILE, "sqlite" uses queue_db.DB_FILE.
+EMAIL_QUEUE_BACKEND = os.getenv("EMAIL_QUEUE_BACKEND", "json").strip().lower()
+# How long a worker may hold a claimed record before others may re-claim it.
+EMAIL_QUEUE_LEASE_SECONDS = float(os.getenv("EMAIL_QUEUE_LEASE_SECONDS", "300"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
 
+def new_lease_owner() -> str:
+    """A lease owner unique to one claim: WORKER_ID plus a random suffix.
 
-def _selfie_filename(extension: str) -> Path:
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S_%f")
-    return SELFIE_DIR / f"selfie_{timestamp}.{extension}"
+    Status writes are fenced on it, so even a later claim by the same process
+    (after this one's lease ran out) is told apart from this one.
+    """
+    return f"{WORKER_ID}:{uuid.uuid4().hex[:8]}"
+
+
+def _use_sqlite() -> bool:
+    return EMAIL_QUEUE_BACKEND == "sqlite"
 
 
 def save_selfie_from_data_url(data_url: str) -> Path:
@@ -25,13 +51,8 @@ def save_selfie_from_data_url(data_url: str) -> Path:
     if not encoded:
         raise ValueError("Invalid data URL provided for selfie")
 
-    extension = "png" if "png" in header else "jpeg"
-    target_path = _selfie_filename(extension)
-
-    with open(target_path, "wb") as f:
-        f.write(base64.b64decode(encoded))
-
-    return target_path
+    extension = "png" if "png" in header else "jpg"
+    return selfie_store.put(base64.b64decode(encoded), extension)
 
 
 def save_selfie_bytes(data: bytes, mime_type: Optional[str] = None) -> Path:
@@ -43,12 +64,9 @@ def save_selfie_bytes(data: bytes, mime_type: Optional[str] = None) -> Path:
     if mime_type and "/" in mime_type:
         candidate = mime_type.split("/")[-1].lower()
         if candidate in {"png", "jpg", "jpeg"}:
-            extension = "jpg" if candidate == "jpeg" else candidate
+            extension = candidate
 
-    target_path = _selfie_filename(extension)
-    with open(target_path, "wb") as f:
-        f.write(data)
-    return target_path
+    return selfie_store.put(data, extension)
 
 
 def ensure_storage() -> None:
@@ -57,11 +75,12 @@ def ensure_storage() -> None:
     EMAIL_QUEUE_FILE.parent.mkdir(parents=True, exist_ok=True)
 
 
-def _load_email_queue_raw() -> List[Dict]:
-    if not EMAIL_QUEUE_FILE.exists():
+def _load_email_queue_raw(path: Optional[Path] = None) -> List[Dict]:
+    path = path or EMAIL_QUEUE_FILE
+    if not path.exists():
         return []
     try:
-        data = json.loads(EMAIL_QUEUE_FILE.read_text())
+        data = json.loads(path.read_text())
     except json.JSONDecodeError:
         return []
     if isinstance(data, list):
@@ -69,117 +88,473 @@ def _load_email_queue_raw() -> List[Dict]:
     return []
 
 
-def _normalize_iso(value: Optional[str], *, default: Optional[datetime] = None) -> str:
-    if not value:
-        dt = default or datetime.now(timezone.utc)
-    else:
+class _QueueFileLock:
+    """Re-entrant lock guarding EMAIL_QUEUE_FILE across threads and processes.
+
+    Threads serialise on an RLock; the outermost acquisition additionally takes
+    an exclusive ``flock`` on a sidecar ``.lock`` file so other Streamlit/uvicorn
+    workers wait instead of overwriting each other's changes.
+    """
+
+    def __init__(self) -> None:
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._handle: Optional[IO[str]] = None
+
+    def __enter__(self) -> "_QueueFileLock":
+        self._rlock.acquire()
+        if self._depth == 0 and fcntl is not None:
+            try:
+                lock_path = EMAIL_QUEUE_FILE.with_name(EMAIL_QUEUE_FILE.name + ".lock")
+                lock_path.parent.mkdir(parents=True, exist_ok=True)
+                self._handle = open(lock_path, "a+")
+                fcntl.flock(self._handle.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._handle is not None:
+                    self._handle.close()
+                    self._handle = None
+                self._rlock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._handle is not None:
+            fcntl.flock(self._handle.fileno(), fcntl.LOCK_UN)
+            self._handle.close()
+            self._handle = None
+        self._rlock.release()
+
+
+class _QueueCache:
+    """Parsed view of EMAIL_QUEUE_FILE that is only re-read when the file changes.
+
+    The file's (mtime, size, inode) is compared on every access, so writes from
+    other processes are picked up while repeated reads in this process skip JSON
+    parsing. ``by_id`` avoids linear scans for status updates.
+    """
+
+    def __init__(self) -> None:
+        self.lock = _QueueFileLock()
+        self.records: List[QueueRecord] = []
+        self.by_id: Dict[str, QueueRecord] = {}
+        self._stamp: Optional[Tuple[int, int, int]] = None
+        self._loaded = False
+
+    @staticmethod
+    def _file_stamp() -> Optional[Tuple[int, int, int]]:
         try:
-            dt = datetime.fromisoformat(value)
-        except ValueError:
-            dt = default or datetime.now(timezone.utc)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc).isoformat()
-
-
-def _normalize_record(record: Dict) -> Dict:
-    record.setdefault("id", str(uuid.uuid4()))
-    record.setdefault("status", "pending")
-    record.setdefault("sent_at", None)
-    record.setdefault("email_body", None)
-    record.setdefault("llm_description", record.get("llm_description"))
-    # Backward compatibility: ensure datetime fields exist
-    now = datetime.now(timezone.utc)
-    record["queued_at"] = _normalize_iso(record.get("queued_at"), default=now)
-    record["send_at"] = _normalize_iso(record.get("send_at"), default=now)
-    sent_at = record.get("sent_at")
-    if sent_at:
-        record["sent_at"] = _normalize_iso(sent_at)
-    failed_at = record.get("failed_at")
-    if failed_at:
-        record["failed_at"] = _normalize_iso(failed_at)
-    return record
-
-
-def load_email_queue() -> List[Dict]:
-    return [_normalize_record(rec) for rec in _load_email_queue_raw()]
-
-
-def save_email_queue(records: List[Dict]) -> None:
-    EMAIL_QUEUE_FILE.write_text(json.dumps(records, indent=2))
-
-
-def queue_email(email: str, selfie_path: Optional[Path], description: Optional[str]) -> Dict:
+            stat = EMAIL_QUEUE_FILE.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def _index(self, records: List[QueueRecord]) -> None:
+        self.records = records
+        self.by_id = {rec.id: rec for rec in records}
+
+    def refresh(self) -> None:
+        """Re-read the file if it changed since the last load. Caller holds ``lock``."""
+        stamp = self._file_stamp()
+        if self._loaded and stamp == self._stamp:
+            return
+        self._index([QueueRecord.from_dict(rec) for rec in _load_email_queue_raw()])
+        self._stamp = stamp
+        self._loaded = True
+
+    def store(self, records: List[QueueRecord]) -> None:
+        """Atomically replace the file with ``records`` and cache them. Caller holds ``lock``."""
+        tmp_path = EMAIL_QUEUE_FILE.with_name(EMAIL_QUEUE_FILE.name + ".tmp")
+        tmp_path.write_text(json.dumps([rec.to_dict() for rec in records], indent=2))
+        os.replace(tmp_path, EMAIL_QUEUE_FILE)
+        if records is not self.records:
+            self._index(records)
+        self._stamp = self._file_stamp()
+        self._loaded = True
+
+    def add(self, record: QueueRecord) -> None:
+        self.records.append(record)
+        self.by_id[record.id] = record
+        self.store(self.records)
+
+
+_queue_cache = _QueueCache()
+
+
+def load_email_queue() -> List[QueueRecord]:
+    if _use_sqlite():
+        return queue_db.load_records()
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        return [rec.copy() for rec in _queue_cache.records]
+
+
+def save_email_queue(records: List[QueueRecord]) -> None:
+    with _queue_cache.lock:
+        _queue_cache.store(list(records))
+
+
+def queue_email(
+    email: str,
+    selfie_path: Optional[Path],
+    description: Optional[str],
+    *,
+    lease_owner: Optional[str] = None,
+    priority: QueuePriority = QueuePriority.SCHEDULED,
+) -> QueueRecord:
+    """Append a pending record. With ``lease_owner`` it is stored already claimed."""
     ensure_storage()
-    now = datetime.now(timezone.utc)
-    send_at = now
-
-    queue_record = _normalize_record(
-        {
-            "id": str(uuid.uuid4()),
-            "email": email,
-            "selfie_path": str(selfie_path) if selfie_path else None,
-            "llm_description": description,
-            "email_body": None,
-            "queued_at": now.isoformat(),
-            "send_at": send_at.isoformat(),
-            "status": "pending",
-            "sent_at": None,
-        }
-    )
+    queue_record = _new_record(email, selfie_path, description, priority)
+    if lease_owner:
+        queue_record.claim(lease_owner, queue_record.queued_at + EMAIL_QUEUE_LEASE_SECONDS)
 
-    records = load_email_queue()
-    records.append(queue_record)
-    save_email_queue(records)
+    if _use_sqlite():
+        queue_db.insert_record(queue_record)
+    else:
+        with _queue_cache.lock:
+            _queue_cache.refresh()
+            _queue_cache.add(queue_record)
+        queue_record = queue_record.copy()
 
+    wakeup.send_wakeup(queue_record.id, queue_record.send_at)
     return queue_record
 
 
-def get_due_emails(current_time: Optional[datetime] = None) -> List[Dict]:
+def queue_email_coalesced(
+    email: str,
+    selfie_path: Optional[Path],
+    description: Optional[str],
+    *,
+    window: float,
+    lease_owner: Optional[str] = None,
+    priority: QueuePriority = QueuePriority.SCHEDULED,
+) -> Tuple[QueueRecord, List[QueueRecord]]:
+    """Queue like ``queue_email``, merging with the recipient's records from the last ``window`` seconds.
+
+    If a pending or in-flight record of the same recipient already references
+    this selfie, the submission is a duplicate and nothing new is stored;
+    submissions without a selfie are never treated as duplicates. With
+    ``lease_owner``, the recipient's open records that no one else is sending
+    are claimed together with the new one, to be dispatched as one email.
+    Returns the new (or duplicated) record and the records now leased to
+    ``lease_owner``; the latter is empty if the duplicate is being sent elsewhere.
+    """
+    if window <= 0:
+        record = queue_email(email, selfie_path, description, lease_owner=lease_owner, priority=priority)
+        return record, [record] if lease_owner else []
+
+    ensure_storage()
+    new = _new_record(email, selfie_path, description, priority)
+    now = new.queued_at
+    result: List[Tuple[QueueRecord, List[QueueRecord]]] = []
+
+    def merge(open_records: List[QueueRecord]) -> List[QueueRecord]:
+        recent = [
+            rec
+            for rec in open_records
+            if rec.recipient_key == new.recipient_key and rec.queued_at >= now - window
+        ]
+        duplicate = None
+        if new.selfie_path is not None:
+            duplicate = next((rec for rec in recent if rec.selfie_path == new.selfie_path), None)
+        stored = [] if duplicate else [new]
+        record = duplicate or new
+        if lease_owner is None or (duplicate is not None and not _is_joinable(duplicate, now)):
+            result.append((record, []))
+            return stored
+        claimed = [rec for rec in recent if _is_joinable(rec, now)] + stored
+        for rec in claimed:
+            rec.claim(lease_owner, now + EMAIL_QUEUE_LEASE_SECONDS)
+            if priority.rank < rec.priority.rank:
+                rec.priority = priority
+        result.append((record, claimed))
+        return claimed
+
+    if _use_sqlite():
+        queue_db.modify_open_records(merge)
+    else:
+        with _queue_cache.lock:
+            _queue_cache.refresh()
+            changed = merge([rec for rec in _queue_cache.records if rec.status in _OPEN_STATUSES])
+            for rec in changed:
+                if rec.id not in _queue_cache.by_id:
+                    _queue_cache.records.append(rec)
+                    _queue_cache.by_id[rec.id] = rec
+            if changed:
+                _queue_cache.store(_queue_cache.records)
+        result = [(record.copy(), [rec.copy() for rec in claimed]) for record, claimed in result]
+
+    record, claimed = result[0]
+    if record.id == new.id:
+        wakeup.send_wakeup(record.id, record.send_at)
+    return record, claimed
+
+
+_OPEN_STATUSES = (QueueStatus.PENDING, QueueStatus.IN_FLIGHT)
+
+
+def _is_joinable(record: QueueRecord, current_ts: float) -> bool:
+    """Pending (due or not), or in flight under an expired lease."""
+    return record.status is QueueStatus.PENDING or record.is_claimable(current_ts)
+
+
+def _new_record(
+    email: str,
+    selfie_path: Optional[Path],
+    description: Optional[str],
+    priority: QueuePriority,
+) -> QueueRecord:
+    now = time.time()
+    return QueueRecord(
+        id=str(uuid.uuid4()),
+        email=email,
+        selfie_path=str(selfie_path) if selfie_path else None,
+        llm_description=description,
+        queued_at=now,
+        send_at=now,
+        priority=priority,
+    )
+
+
+def get_due_emails(current_time: Optional[datetime] = None) -> List[QueueRecord]:
     current_time = current_time or datetime.now(timezone.utc)
-    records = load_email_queue()
-    due: List[Dict] = []
-    for record in records:
-        send_at = None
-        send_at_iso = record.get("send_at")
-        if send_at_iso:
-            try:
-                send_at = datetime.fromisoformat(send_at_iso)
-            except ValueError:
-                send_at = None
-            if send_at and send_at.tzinfo is None:
-                send_at = send_at.replace(tzinfo=timezone.utc)
-        if record.get("status") == "pending" and send_at and send_at <= current_time:
-            due.append(record)
-    return due
-
-
-def mark_email_sent(record_id: str, email_body: Optional[str], description: Optional[str]) -> None:
-    records = load_email_queue()
-    updated = False
-    for record in records:
-        if record.get("id") == record_id:
-            record["status"] = "sent"
-            record["sent_at"] = datetime.now(timezone.utc).isoformat()
-            if email_body:
-                record["email_body"] = email_body
-            if description:
-                record["llm_description"] = description
-            updated = True
-            break
-    if updated:
-        save_email_queue(records)
-
-
-def mark_email_failed(record_id: str, reason: str) -> None:
-    records = load_email_queue()
-    updated = False
+    if _use_sqlite():
+        return queue_db.fetch_due(current_time)
+    current_ts = current_time.timestamp()
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        return [record.copy() for record in _queue_cache.records if record.is_due(current_ts)]
+
+
+def claim_due_emails(
+    owner: str = WORKER_ID,
+    current_time: Optional[datetime] = None,
+    *,
+    lease_seconds: Optional[float] = None,
+    limit: Optional[int] = None,
+    priority: Optional[QueuePriority] = None,
+) -> List[QueueRecord]:
+    """Claim due records for ``owner`` so no other worker dispatches them.
+
+    Claimed records move to ``in_flight`` with a lease; records whose lease has
+    expired (the worker died mid-send) are reclaimed here as well. ``priority``
+    restricts the claim to a single lane.
+    """
+    current_ts = (current_time or datetime.now(timezone.utc)).timestamp()
+    lease_seconds = EMAIL_QUEUE_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    lease_expires_at = time.time() + lease_seconds
+    if _use_sqlite():
+        return queue_db.claim_due(
+            owner, lease_expires_at, current_ts, limit, priority.value if priority else None
+        )
+
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        claimed: List[QueueRecord] = []
+        for record in sorted(_queue_cache.records, key=lambda rec: rec.send_at):
+            if limit is not None and len(claimed) >= limit:
+                break
+            if priority is not None and record.priority is not priority:
+                continue
+            if record.is_claimable(current_ts):
+                record.claim(owner, lease_expires_at)
+                claimed.append(record.copy())
+        if claimed:
+            _queue_cache.store(_queue_cache.records)
+    return claimed
+
+
+def claim_due_for_recipients(
+    owner: str,
+    recipients: Iterable[str],
+    current_time: Optional[datetime] = None,
+    *,
+    lease_seconds: Optional[float] = None,
+) -> List[QueueRecord]:
+    """Claim every other claimable record addressed to one of ``recipients``.
+
+    ``recipients`` are ``QueueRecord.recipient_key`` values. Used after a
+    batch claim so records for one address are dispatched (and coalesced)
+    together even when they are spread across the queue.
+    """
+    keys = set(recipients)
+    if not keys:
+        return []
+    current_ts = (current_time or datetime.now(timezone.utc)).timestamp()
+    lease_seconds = EMAIL_QUEUE_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    lease_expires_at = time.time() + lease_seconds
+    claimed: List[QueueRecord] = []
+
+    def claim(open_records: List[QueueRecord]) -> List[QueueRecord]:
+        for record in open_records:
+            if record.recipient_key in keys and record.is_claimable(current_ts):
+                record.claim(owner, lease_expires_at)
+                claimed.append(record)
+        return claimed
+
+    if _use_sqlite():
+        queue_db.modify_open_records(claim)
+        return sorted(claimed, key=lambda rec: rec.send_at)
+
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        claim([rec for rec in _queue_cache.records if rec.status in _OPEN_STATUSES])
+        if claimed:
+            _queue_cache.store(_queue_cache.records)
+    return sorted((rec.copy() for rec in claimed), key=lambda rec: rec.send_at)
+
+
+def renew_leases(record_ids: List[str], owner: str, *, lease_seconds: Optional[float] = None) -> int:
+    """Extend the leases ``owner`` still holds on ``record_ids``. Returns how many were extended."""
+    if not record_ids:
+        return 0
+    lease_seconds = EMAIL_QUEUE_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    lease_expires_at = time.time() + lease_seconds
+    if _use_sqlite():
+        return queue_db.renew_leases(record_ids, owner, lease_expires_at)
+
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        renewed = 0
+        for record_id in record_ids:
+            record = _queue_cache.by_id.get(record_id)
+            if record is not None and record.status is QueueStatus.IN_FLIGHT and record.lease_owner == owner:
+                record.lease_expires_at = lease_expires_at
+                renewed += 1
+        if renewed:
+            _queue_cache.store(_queue_cache.records)
+    return renewed
+
+
+def pending_wake_times() -> List[Tuple[float, str]]:
+    """(epoch, record id) at which each unfinished record next needs attention.
+
+    Pending records are keyed on ``send_at``; in-flight records on their lease
+    expiry, when they become claimable again.
+    """
+    if _use_sqlite():
+        return queue_db.fetch_wake_times()
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        records = list(_queue_cache.records)
+    wake_times: List[Tuple[float, str]] = []
     for record in records:
-        if record.get("id") == record_id:
-            record["status"] = "failed"
-            record["error"] = reason
-            record["failed_at"] = datetime.now(timezone.utc).isoformat()
-            updated = True
-            break
-    if updated:
-        save_email_queue(records)
+        if record.status is QueueStatus.PENDING:
+            wake_times.append((record.send_at, record.id))
+        elif record.status is QueueStatus.IN_FLIGHT:
+            wake_times.append((record.lease_expires_at or 0.0, record.id))
+    return wake_times
+
+
+def mark_email_sent(
+    record_id: str,
+    email_body: Optional[str],
+    description: Optional[str],
+    *,
+    needs_enrichment: bool = False,
+    owner: Optional[str] = None,
+) -> bool:
+    """Mark the record sent. With ``owner`` only while that owner still holds
+    its lease; returns False if the record is unknown or was re-claimed."""
+    now = time.time()
+    if _use_sqlite():
+        fields = {
+            "status": QueueStatus.SENT.value,
+            "sent_at": epoch_to_iso(now),
+            "lease_owner": None,
+            "lease_expires_at": None,
+            "needs_enrichment": 1 if needs_enrichment else None,
+        }
+        if email_body:
+            fields["email_body"] = email_body
+        if description:
+            fields["llm_description"] = description
+        return queue_db.update_record(record_id, owner=owner, **fields)
+
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        record = _queue_cache.by_id.get(record_id)
+        if record is None or not _holds_lease(record, owner):
+            return False
+        record.status = QueueStatus.SENT
+        record.sent_at = now
+        record.release_lease()
+        record.needs_enrichment = needs_enrichment
+        if email_body:
+            record.email_body = email_body
+        if description:
+            record.llm_description = description
+        _queue_cache.store(_queue_cache.records)
+    return True
+
+
+def mark_email_failed(
+    record_id: str,
+    reason: str,
+    *,
+    retry_at: Optional[float] = None,
+    owner: Optional[str] = None,
+) -> bool:
+    """Record a failed attempt. With ``retry_at`` the record goes back to pending
+    in the retry lane instead of becoming terminal. ``owner`` fences the write
+    as in ``mark_email_sent``."""
+    now = time.time()
+    if _use_sqlite():
+        return queue_db.record_failed_attempt(record_id, reason, now, retry_at, owner=owner)
+
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        record = _queue_cache.by_id.get(record_id)
+        if record is None or not _holds_lease(record, owner):
+            return False
+        record.attempts += 1
+        record.error = reason
+        record.release_lease()
+        if retry_at is None:
+            record.status = QueueStatus.FAILED
+            record.failed_at = now
+        else:
+            record.status = QueueStatus.PENDING
+            record.priority = QueuePriority.RETRY
+            record.send_at = retry_at
+        _queue_cache.store(_queue_cache.records)
+    return True
+
+
+def _holds_lease(record: QueueRecord, owner: Optional[str]) -> bool:
+    return owner is None or (record.status is QueueStatus.IN_FLIGHT and record.lease_owner == owner)
+
+
+def terminal_records_before(cutoff_ts: float) -> List[QueueRecord]:
+    """Return sent/failed records whose completion time is older than ``cutoff_ts``."""
+    if _use_sqlite():
+        records = queue_db.fetch_terminal()
+    else:
+        with _queue_cache.lock:
+            _queue_cache.refresh()
+            records = [rec.copy() for rec in _queue_cache.records if rec.is_terminal]
+    return [rec for rec in records if rec.finished_at <= cutoff_ts]
+
+
+def remove_records(record_ids: List[str]) -> int:
+    """Delete records from the hot queue by id. Returns the number removed."""
+    if not record_ids:
+        return 0
+    if _use_sqlite():
+        return queue_db.delete_records(record_ids)
+
+    doomed = set(record_ids)
+    with _queue_cache.lock:
+        _queue_cache.refresh()
+        kept = [rec for rec in _queue_cache.records if rec.id not in doomed]
+        removed = len(_queue_cache.records) - len(kept)
+        if removed:
+            _queue_cache.store(kept)
+    return removed
+
+
+def migrate_json_queue_to_sqlite(json_path: Optional[Path] = None) -> int:
+    """Copy every record from the JSON queue into SQLite; ids already present are skipped."""
+    records = [QueueRecord.from_dict(rec) for rec in _load_email_queue_raw(json_path)]
+    return queue_db.insert_records(records)
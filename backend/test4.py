@@ -8,21 +8,45 @@ user completes the consent/selfie flow in the UI.
 from __future__ import annotations
 
 import base64
+import hashlib
 import json
+import logging
 import os
+import threading
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no flock
+    fcntl = None
 
 import requests
-from dotenv import load_dotenv
+
+from . import env  # noqa: F401
+from . import hedging, http_client
+
+logger = logging.getLogger(__name__)
 
 AUTH_URL = "https://auth.igloohome.co/oauth2/token"
 API_BASE_URL = "https://api.igloodeveloper.co"
 DEFAULT_ACCESS_NAME = "Maintenance guy"
 DEFAULT_VARIANCE = 1
 DEFAULT_TZ_OFFSET = 0
+# Refresh cached access tokens this many seconds before they expire.
+TOKEN_REFRESH_MARGIN_SECONDS = 60
+# Used when the token response carries no expires_in.
+DEFAULT_TOKEN_TTL_SECONDS = 3600
 
-load_dotenv()
+# Optional file shared by all workers on a host so they reuse one access token.
+TOKEN_CACHE_FILE = os.getenv("IGLOO_TOKEN_CACHE_FILE")
+
+# Send a second PIN request when the first is slower than the recent p95.
+IGLOO_HEDGE = os.getenv("IGLOO_HEDGE", "false").lower() in {"1", "true", "yes"}
+_pin_latency = hedging.LatencyTracker("Igloohome PIN")
+_pin_hedge_pool = hedging.HedgePool("igloo", int(os.getenv("IGLOO_HEDGE_WORKERS", "4")))
 
 
 class IglooConfigError(RuntimeError):
@@ -33,6 +57,10 @@ class IglooRequestError(RuntimeError):
     """Raised when the Igloohome API returns an unexpected response."""
 
 
+class IglooUnauthorizedError(IglooRequestError):
+    """Raised when the API rejects the access token (HTTP 401)."""
+
+
 def _next_top_of_hour(tz_offset_hours: int) -> str:
     """Return startDate string formatted as required by the Igloohome API."""
     if not (-12 <= tz_offset_hours <= 14):
@@ -58,6 +86,11 @@ def _next_top_of_hour(tz_offset_hours: int) -> str:
     return f"{start_local.strftime('%Y-%m-%dT%H')}:00:00{offset_str}"
 
 
+def next_start_date(tz_offset_hours: int = DEFAULT_TZ_OFFSET) -> str:
+    """The startDate a PIN requested now would get; PINs are interchangeable within it."""
+    return _next_top_of_hour(tz_offset_hours)
+
+
 def _get_env(name: str) -> str:
     value = os.getenv(name)
     if not value:
@@ -65,9 +98,13 @@ def _get_env(name: str) -> str:
     return value
 
 
+def default_device_id() -> str:
+    return _get_env("IGLOO_DEVICE_ID")
+
+
 def _fetch_access_token(client_id: str, client_secret: str) -> Dict[str, Any]:
     credentials = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
-    response = requests.post(
+    response = http_client.post(
         AUTH_URL,
         headers={
             "Authorization": f"Basic {credentials}",
@@ -77,6 +114,7 @@ def _fetch_access_token(client_id: str, client_secret: str) -> Dict[str, Any]:
             "grant_type": "client_credentials",
         },
         timeout=15,
+        idempotent=True,
     )
     try:
         response.raise_for_status()
@@ -89,6 +127,96 @@ def _fetch_access_token(client_id: str, client_secret: str) -> Dict[str, Any]:
     return payload
 
 
+class _TokenCache:
+    """Access tokens per client id, valid until shortly before ``expires_in``.
+
+    Refreshes are single-flight: concurrent callers wait on one lock and reuse
+    the token the first caller fetched. With ``IGLOO_TOKEN_CACHE_FILE`` set the
+    token is also shared through that file (guarded by ``flock``) so other
+    worker processes do not fetch their own.
+    """
+
+    def __init__(self) -> None:
+        self._tokens: Dict[str, Tuple[str, float]] = {}
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def _key(client_id: str) -> str:
+        return hashlib.sha256(client_id.encode()).hexdigest()[:16]
+
+    def _fresh(self, key: str) -> Optional[str]:
+        cached = self._tokens.get(key)
+        if cached and cached[1] - TOKEN_REFRESH_MARGIN_SECONDS > time.time():
+            return cached[0]
+        return None
+
+    def _load_disk(self, key: str) -> None:
+        if not TOKEN_CACHE_FILE:
+            return
+        try:
+            entry = json.loads(Path(TOKEN_CACHE_FILE).read_text()).get(key)
+        except (OSError, ValueError, AttributeError):
+            return
+        if entry and "access_token" in entry and "expires_at" in entry:
+            self._tokens[key] = (entry["access_token"], float(entry["expires_at"]))
+
+    def _store_disk(self, key: str) -> None:
+        if not TOKEN_CACHE_FILE:
+            return
+        path = Path(TOKEN_CACHE_FILE)
+        try:
+            data = json.loads(path.read_text()) if path.exists() else {}
+        except (OSError, ValueError):
+            data = {}
+        token, expires_at = self._tokens[key]
+        data[key] = {"access_token": token, "expires_at": expires_at}
+        tmp_path = path.with_name(path.name + ".tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def get(self, client_id: str, client_secret: str) -> str:
+        key = self._key(client_id)
+        token = self._fresh(key)
+        if token:
+            return token
+        with self._refresh_lock:
+            token = self._fresh(key)
+            if token:
+                return token
+            lock_file = None
+            if TOKEN_CACHE_FILE and fcntl is not None:
+                lock_file = open(TOKEN_CACHE_FILE + ".lock", "a+")
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                self._load_disk(key)
+                token = self._fresh(key)
+                if token:
+                    return token
+                payload = _fetch_access_token(client_id, client_secret)
+                ttl = float(payload.get("expires_in") or DEFAULT_TOKEN_TTL_SECONDS)
+                self._tokens[key] = (payload["access_token"], time.time() + ttl)
+                logger.debug("Fetched Igloohome access token, expires in %.0fs", ttl)
+                self._store_disk(key)
+                return payload["access_token"]
+            finally:
+                if lock_file is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                    lock_file.close()
+
+    def invalidate(self, client_id: str) -> None:
+        self._tokens.pop(self._key(client_id), None)
+
+
+_token_cache = _TokenCache()
+
+
+def get_access_token(client_id: str, client_secret: str) -> str:
+    """Return a cached access token, fetching a new one only when it is about to expire."""
+    return _token_cache.get(client_id, client_secret)
+
+
 def _request_one_time_pin(
     access_token: str,
     device_id: str,
@@ -101,20 +229,29 @@ def _request_one_time_pin(
     if not (1 <= variance <= 5):
         raise ValueError("For One-Time (OTP), 'variance' must be between 1 and 5 inclusive.")
 
-    response = requests.post(
-        f"{API_BASE_URL}/igloohome/devices/{device_id}/algopin/onetime",
-        headers={
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json",
-            "Accept": "application/json",
-        },
-        json={
-            "variance": variance,
-            "startDate": start_date,
-            "accessName": access_name,
-        },
-        timeout=30,
+    # Retrying and hedging are safe: a duplicate request only mints another PIN for the same window.
+    response = hedging.hedged(
+        lambda: http_client.post(
+            f"{API_BASE_URL}/igloohome/devices/{device_id}/algopin/onetime",
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+            },
+            json={
+                "variance": variance,
+                "startDate": start_date,
+                "accessName": access_name,
+            },
+            timeout=30,
+            idempotent=True,
+        ),
+        _pin_latency,
+        _pin_hedge_pool,
+        enabled=IGLOO_HEDGE,
     )
+    if response.status_code == 401:
+        raise IglooUnauthorizedError("Igloohome rejected the access token")
     try:
         response.raise_for_status()
     except requests.HTTPError as exc:  # pragma: no cover - defensive
@@ -128,8 +265,11 @@ def generate_one_time_pin(
     access_name: Optional[str] = None,
     variance: int = DEFAULT_VARIANCE,
     tz_offset_hours: int = DEFAULT_TZ_OFFSET,
+    device_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    client_id: Optional[str] = None,
+    client_secret: Optional[str] = None,
 ) -> Dict[str, Any]:
-    print("generating one time pin...")
     """Generate a one-time pin and return the API payload.
 
     Returns a dictionary with the following keys:
@@ -138,23 +278,32 @@ def generate_one_time_pin(
     - ``raw``: raw response payload from the OTP endpoint
     """
 
-    client_id = _get_env("IGLOO_CLIENT_ID")
-    client_secret = _get_env("IGLOO_CLIENT_SECRET")
-    device_id = _get_env("IGLOO_DEVICE_ID")
-
-    token_payload = _fetch_access_token(client_id, client_secret)
-    print("fetched access token... ", token_payload)
-    access_token = token_payload["access_token"]
-
-    start_date = _next_top_of_hour(tz_offset_hours)
-    response_payload = _request_one_time_pin(
-        access_token=access_token,
-        device_id=device_id,
-        variance=variance,
-        start_date=start_date,
-        access_name=access_name or DEFAULT_ACCESS_NAME,
-    )
-    print("requested one time pin... ", response_payload)
+    client_id = client_id or _get_env("IGLOO_CLIENT_ID")
+    client_secret = client_secret or _get_env("IGLOO_CLIENT_SECRET")
+    device_id = device_id or default_device_id()
+
+    start_date = start_date or next_start_date(tz_offset_hours)
+    logger.debug("Requesting Igloohome one-time PIN for device %s starting %s", device_id, start_date)
+    try:
+        response_payload = _request_one_time_pin(
+            access_token=get_access_token(client_id, client_secret),
+            device_id=device_id,
+            variance=variance,
+            start_date=start_date,
+            access_name=access_name or DEFAULT_ACCESS_NAME,
+        )
+    except IglooUnauthorizedError:
+        # The cached token was revoked early; fetch a new one and try once more.
+        _token_cache.invalidate(client_id)
+        response_payload = _request_one_time_pin(
+            access_token=get_access_token(client_id, client_secret),
+            device_id=device_id,
+            variance=variance,
+            start_date=start_date,
+            access_name=access_name or DEFAULT_ACCESS_NAME,
+        )
+    # The payload carries the PIN itself, so only its keys are logged.
+    logger.debug("Igloohome one-time PIN response for device %s: keys %s", device_id, sorted(response_payload))
     code = response_payload.get("pin")
     if not code:
         raise IglooRequestError("Igloohome response did not include an OTP code")
@@ -163,8 +312,9 @@ def generate_one_time_pin(
 
 
 def main() -> None:
+    logging.basicConfig(level=logging.DEBUG)
     result = generate_one_time_pin()
-    print(result)
+    logger.debug("Generated a one-time PIN (%d digits)", len(str(result)))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+"""Best-effort wake-up signal from enqueuers to the dispatcher daemon.
+
+``storage.queue_email`` fires a small UDP datagram at ``DISPATCHER_WAKE_ADDR``
+so a running ``backend.dispatcher`` can schedule the new record without
+polling. Nothing listening is fine: the datagram is simply dropped and the
+dispatcher picks the record up on its next rescan.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import socket
+import time
+from typing import Optional, Tuple
+
+from . import env  # noqa: F401
+
+logger = logging.getLogger(__name__)
+
+# "host:port" on which the dispatcher listens; empty disables wake-ups.
+DISPATCHER_WAKE_ADDR = os.getenv("DISPATCHER_WAKE_ADDR", "127.0.0.1:8765")
+
+
+def _address() -> Optional[Tuple[str, int]]:
+    if not DISPATCHER_WAKE_ADDR:
+        return None
+    host, _, port = DISPATCHER_WAKE_ADDR.rpartition(":")
+    try:
+        return host or "127.0.0.1", int(port)
+    except ValueError:
+        logger.warning("Ignoring malformed DISPATCHER_WAKE_ADDR %r", DISPATCHER_WAKE_ADDR)
+        return None
+
+
+def send_wakeup(record_id: str, send_at: float) -> None:
+    address = _address()
+    if address is None:
+        return
+    payload = json.dumps({"id": record_id, "send_at": send_at}).encode()
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(payload, address)
+    except OSError:
+        logger.debug("Dispatcher wake-up not delivered", exc_info=True)
+
+
+class WakeupListener:
+    """UDP socket the dispatcher blocks on between due times."""
+
+    def __init__(self) -> None:
+        self._sock: Optional[socket.socket] = None
+        address = _address()
+        if address is None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind(address)
+        except OSError:
+            sock.close()
+            logger.warning("Could not bind dispatcher wake-up socket on %s:%s; relying on rescans", *address)
+            return
+        self._sock = sock
+
+    def wait(self, timeout: float) -> Optional[Tuple[str, float]]:
+        """Block for up to ``timeout`` seconds; return ``(record_id, send_at)`` if woken."""
+        if self._sock is None:
+            time.sleep(max(timeout, 0.0))
+            return None
+        self._sock.settimeout(max(timeout, 0.001))
+        try:
+            data, _ = self._sock.recvfrom(4096)
+        except (socket.timeout, BlockingIOError):
+            return None
+        try:
+            message = json.loads(data)
+            return str(message["id"]), float(message["send_at"])
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def close(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
@@ -1,17 +1,23 @@
 from __future__ import annotations
 
+import contextvars
+import itertools
 import json
-import time
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 
 import streamlit as st
 from dotenv import load_dotenv
 
-from backend import code_generator, emailer, storage
+from backend import code_generator, deadline, devices, emailer, storage
 
 load_dotenv()
 storage.ensure_storage()
 
+# Set to false when `python -m backend.dispatcher` delivers the queue instead.
+DISPATCH_IN_UI = os.getenv("EMAIL_DISPATCH_IN_UI", "true").lower() in {"1", "true", "yes"}
+
 MESSAGES = [
     "Syncing biometric glitter...",
     "Reticulating user reputation...",
@@ -354,6 +360,18 @@ def render_stepper(active_stage: int) -> None:
     #st.markdown(f"<div class='stepper'>{''.join(chips)}</div>", unsafe_allow_html=True)
 
 
+@st.cache_resource
+def submission_executor() -> ThreadPoolExecutor:
+    """Shared across reruns and sessions; runs the Igloohome OTP request."""
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="otp")
+
+
+@st.cache_resource
+def start_pin_pool() -> None:
+    """Start pre-minting PINs once per process rather than on every rerun."""
+    code_generator.prefetch_codes()
+
+
 def validate_email(value: str) -> bool:
     return bool(value) and "@" in value and "." in value
 
@@ -410,26 +428,51 @@ def handle_submission(email: str) -> None:
         st.session_state.error = "Bitte gib eine gültige E-Mail-Adresse ein."
         return
 
-    with st.spinner("Bitte warten, wir organisieren deinen Snack-Zauber…"):
+    with st.spinner("Bitte warten, wir organisieren deinen Snack-Zauber…"), deadline.deadline(
+        code_generator.SUBMISSION_DEADLINE_SECONDS
+    ):
         status_placeholder = st.empty()
-        for message in MESSAGES:
-            status_placeholder.info(message)
-            time.sleep(0.65)
-
+        # The PIN does not depend on the selfie or email, so request it first.
+        # Each kiosk tablet opens the app with ?kiosk=<id> to get a PIN for its own box.
+        kiosk = st.query_params.get("kiosk")
+        # The worker thread inherits the submission deadline through the copied context.
+        code_future = submission_executor().submit(contextvars.copy_context().run, code_generator.issue_code, kiosk)
+        messages = itertools.cycle(MESSAGES)
+
+        status_placeholder.info(next(messages))
         selfie_path = storage.save_selfie_bytes(
             st.session_state.selfie_bytes,
             mime_type=st.session_state.selfie_mime,
         )
-        send_at_iso = emailer.schedule_privacy_email(email=email, selfie_path=selfie_path, description=None)
+        status_placeholder.info(next(messages))
+        send_at_iso = emailer.schedule_privacy_email(
+            email=email,
+            selfie_path=selfie_path,
+            description=None,
+            background=True,
+        )
+
+        # Keep the theatre going only for as long as the PIN is actually pending.
+        while not wait([code_future], timeout=0.65).done:
+            status_placeholder.info(next(messages))
 
         try:
-            code = code_generator.generate_code()
+            issued = code_future.result()
+        except code_generator.CodeRateLimitedError as exc:
+            status_placeholder.empty()
+            st.session_state.error = (
+                f"⏳ Gerade wollen alle Snacks. Bitte versuche es in {exc.retry_after} Sekunden noch einmal."
+            )
+            return
         except code_generator.CodeGenerationError as exc:
+            status_placeholder.empty()
             st.session_state.error = f"❌ Fehler bei der Code-Erzeugung: {exc}"
             return
 
     st.session_state.result = {
-        "code": code,
+        "code": issued.code,
+        "device_name": issued.device.name,
+        "device_location": issued.device.location,
         "selfie_path": str(selfie_path),
         "send_at": send_at_iso,
     }
@@ -461,6 +504,11 @@ def render_result() -> None:
     st.markdown("### Schritt 4 · Dein Snack-Zugang")
     st.success("✅ Hier ist dein temporärer Zugangscode, er wird zur nächsten vollen Stunde aktiviert.")
     st.markdown(f"<div class='code-block'>{result['code']}</div>", unsafe_allow_html=True)
+    if len(devices.registry.devices) > 1:
+        where = result["device_name"]
+        if result.get("device_location"):
+            where += f" ({result['device_location']})"
+        st.caption(f"Gilt für: {where}")
 
     send_at = result.get("send_at")
     if send_at:
@@ -498,7 +546,9 @@ def main() -> None:
     st.set_page_config(page_title="cs_lock_app", page_icon="🔐", layout="wide", initial_sidebar_state="collapsed")
     st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
     init_state()
-    emailer.process_due_emails()
+    start_pin_pool()
+    if DISPATCH_IN_UI:
+        emailer.process_due_emails()
 
     render_hero()
     render_stepper(determine_stage())
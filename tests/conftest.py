@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The repository root is itself a package, so pytest would not put it on sys.path.
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
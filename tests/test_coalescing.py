@@ -0,0 +1,50 @@
+import pytest
+
+from backend import emailer, queue_db, storage
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def queue(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "EMAIL_QUEUE_BACKEND", request.param)
+    monkeypatch.setattr(storage, "EMAIL_QUEUE_FILE", tmp_path / "email_queue.json")
+    monkeypatch.setattr(storage, "_queue_cache", storage._QueueCache())
+    monkeypatch.setattr(queue_db, "DB_FILE", tmp_path / "email_queue.sqlite3")
+    return request.param
+
+
+@pytest.fixture
+def sent_groups(monkeypatch):
+    groups = []
+
+    def dispatch_group(records, smtp=None, *, llm_result=None):
+        groups.append(sorted(record.email for record in records))
+        for record in records:
+            assert storage.mark_email_sent(record.id, "body", None, owner=record.lease_owner)
+        return True
+
+    monkeypatch.setattr(emailer, "_dispatch_group", dispatch_group)
+    return groups
+
+
+def test_records_for_one_recipient_are_coalesced_across_chunks(queue, sent_groups, monkeypatch):
+    monkeypatch.setattr(emailer, "_chunk_size", lambda concurrency: 4)
+    for address in ["x", "a", "b", "c", "x", "d", "e", "f", "x"]:
+        storage.queue_email(f"{address}@example.org", None, None)
+
+    summary = emailer.process_due_emails(concurrency=1)
+
+    assert (summary.sent, summary.failed, summary.coalesced) == (9, 0, 2)
+    assert sent_groups.count(["x@example.org"] * 3) == 1
+    assert len(sent_groups) == 7
+    assert not storage.get_due_emails()
+
+
+def test_repeated_selfie_is_a_duplicate_but_selfieless_submissions_are_kept(queue):
+    first, _ = storage.queue_email_coalesced("x@example.org", "/selfies/a.jpg", None, window=900)
+    again, _ = storage.queue_email_coalesced("x@example.org", "/selfies/a.jpg", None, window=900)
+    assert again.id == first.id
+
+    plain, _ = storage.queue_email_coalesced("x@example.org", None, None, window=900)
+    plain_again, _ = storage.queue_email_coalesced("x@example.org", None, None, window=900)
+    assert plain_again.id != plain.id
+    assert len(storage.load_email_queue()) == 3